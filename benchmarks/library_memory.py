@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Measures how much memory a synthetic media library takes up once it has been
+built into Artist, Album, and Song objects, the same way lmswrapper builds it
+from the LMS.
+
+Run it from the base directory, e.g. `python3 benchmarks/library_memory.py 100000`
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lmswrapper
+
+SONGS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 5
+
+def make_songs(num_songs):
+    songs = []
+    for i in range(num_songs):
+        album = i // SONGS_PER_ALBUM
+        artist = album // ALBUMS_PER_ARTIST
+        songs.append({'id': 100000 + i, 'title': f"Synthetic Song Title {i}",
+                      'artist': f"Synthetic Artist {artist}", 'artist_ids': str(artist),
+                      'album': f"Synthetic Album Title {album}", 'album_id': album,
+                      'year': 1970 + (album % 50), 'tracknum': (i % SONGS_PER_ALBUM) + 1,
+                      'compilation': '0'})
+
+    # Round trip through JSON, so every song gets its own copy of each string,
+    # just like a response from the server does
+    return json.loads(json.dumps(songs))
+
+def main():
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # Start tracing before the songs are made, so the strings they hand over count
+    tracemalloc.start()
+    songs = make_songs(num_songs)
+    albums = {}
+    artists = {}
+    copied = set()
+    for song in songs:
+        lmswrapper.add_song_to_library(song, albums, artists, copied)
+    # Let go of the responses, the same way the library outlives them
+    del songs, copied
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{num_songs} songs, {len(albums)} albums, {len(artists)} artists")
+    print(f"Library size: {current / (1024 * 1024):.1f} MiB "
+          f"({current / num_songs:.0f} bytes per song)")
+
+if __name__ == '__main__':
+    main()
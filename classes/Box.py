@@ -264,15 +264,28 @@ class Editbox(Infobox):
         origin = Point(y + y_offset, x + x_offset)
         self.form = Form(origin, self.width - FULL_PADDING, prompt)
 
-    def getInput(self):
+    def getInput(self, on_change=None):
+        """
+        An on_change function is passed along to the form. If it returns True,
+        it drew over us, so we draw ourselves back on top.
+        """
+        self.drawBox()
+
+        def changed(user_input):
+            if on_change(user_input):
+                self.win.touchwin()
+                self.form.win.touchwin()
+                self.drawBox()
+
+        (user_input, ret_code) = self.form.edit(changed if on_change else None)
+
+        return (user_input, ret_code)
+
+    def drawBox(self):
         self.drawBorder()
         self.drawMessage()
         self.drawQuitCommand()
         self.win.refresh()
-        
-        (user_input, ret_code) = self.form.edit()
-
-        return (user_input, ret_code)
 
     def drawMessage(self):
         self.win.attron(curses.A_BOLD)
@@ -0,0 +1,123 @@
+"""
+A Connection is our transport to the LMS. It speaks the same JSON-RPC as the
+lmsquery library (and inherits its helpers, like get_players), but instead of
+opening a brand new HTTP connection for every query, each thread keeps its own
+connection alive and reuses it.
+
+It can also run a handful of independent queries at once on a small pool of
+worker threads, which is handy when we'd otherwise wait on each in turn, or
+send a whole batch of commands down the LMS command line interface (CLI) in
+one go when they have to run in order.
+"""
+
+import http.client
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import lmsquery
+
+QUERY_TIMEOUT = 30
+# Commands sent down the CLI before we stop and wait for their replies
+BATCH_WINDOW = 100
+
+class Connection(lmsquery.LMSQuery):
+    def __init__(self, host, port, cli_port, max_workers):
+        super().__init__(host, port)
+        self.cli_port = int(cli_port)
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def getHTTPConnection(self):
+        if getattr(self.local, 'conn', None) is None:
+            self.local.conn = http.client.HTTPConnection(self.host, int(self.port),
+                                                         timeout=QUERY_TIMEOUT)
+            self.local.reused = False
+
+        return self.local.conn
+
+    def dropHTTPConnection(self):
+        self.local.conn.close()
+        self.local.conn = None
+
+    def query(self, player_id="", *args):
+        body = json.dumps({'id': 1, 'method': 'slim.request', 'params': [player_id, list(args)]}).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+
+        while True:
+            conn = self.getHTTPConnection()
+            reused = self.local.reused
+            try:
+                conn.request('POST', '/jsonrpc.js', body, headers)
+                data = conn.getresponse().read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.dropHTTPConnection()
+                # The server may have closed an idle kept-alive connection on
+                # us, so we get one retry on a fresh connection in that case
+                if not reused:
+                    raise
+
+        self.local.reused = True
+
+        return json.loads(data)['result']
+
+    def query_many(self, queries):
+        """
+        Each query is a tuple of the arguments we would pass to query(). The
+        results come back in the same order as the queries, no matter which
+        one finishes first.
+        """
+        futures = [self.executor.submit(self.query, *query) for query in queries]
+
+        return [future.result() for future in futures]
+
+    def query_batch(self, queries):
+        """
+        Each query is a tuple of the arguments we would pass to query(). Rather
+        than paying a round trip per command, we pipeline the whole batch over
+        a single CLI connection. The server runs them in the order given, and
+        we wait for every reply before returning.
+
+        We don't get results back this way, so this is only meant for commands.
+        """
+        if len(queries) <= 1:
+            # Not worth setting up a CLI connection for a single command
+            for query in queries:
+                self.query(*query)
+            return
+
+        try:
+            sock = socket.create_connection((self.host, self.cli_port), timeout=QUERY_TIMEOUT)
+        except OSError:
+            # No CLI to talk to, so fall back to sending them one at a time
+            for query in queries:
+                self.query(*query)
+            return
+
+        with sock, sock.makefile('rb') as stream:
+            for i in range(0, len(queries), BATCH_WINDOW):
+                window = queries[i:i + BATCH_WINDOW]
+                lines = [format_cli_command(query) for query in window]
+                sock.sendall("".join(lines).encode('utf-8'))
+
+                for query in window:
+                    if stream.readline() == b"":
+                        raise ConnectionError("LMS closed the CLI connection mid-batch")
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+"""
+CLI commands are a single line of URL-encoded tokens, starting with the player
+ID for player commands. Server commands have no player ID at all.
+"""
+def format_cli_command(query):
+    (player_id, *args) = query
+    tokens = [str(arg) for arg in args]
+    if player_id != "":
+        tokens.insert(0, player_id)
+
+    return " ".join(quote(token, safe='') for token in tokens) + "\n"
@@ -3,24 +3,64 @@ The Engine is the heart of the application. It handles inputs, renders screens
 and panels, delegates fetching from the LMS, etc.
 """
 
-import lmsquery
+import curses
+import threading
 
 import inputhandler
+import librarycache
 import lmswrapper
 import paneldriver
 import screenmaker
 from util import Mode, Point
 
 from classes.Box import Infobox
+from classes.Connection import Connection
+from classes.Library import LazyLibrary, LazyPlaylists
+from classes.Listener import Listener
+from classes.Loader import Loader
+from classes.Monitor import RescanMonitor
 from classes.Music import LMSPlayer
 from classes.Panel import Playbar, Statusline
+from classes.Scheduler import Scheduler
 from classes.Screen import Screen
+from classes.SearchIndex import SearchIndex
+from classes.State import PlayerState
+
+LOADING_MESSAGES = {
+                     "Playlist": "Fetching Current Playlist...",
+                     "Media Library": "Fetching Media Library...",
+                     "Saved Playlists": "Fetching Saved Playlists...",
+                     "Search Results": "Searching the Server..."
+                   }
+
+# Keys that only move around our own screens, so the player can't have changed
+NAVIGATION_KEYS = {ord(key) for key in "jJkKgGhl12345%'"} | {curses.KEY_RESIZE}
 
 class Engine:
     def __init__(self, config, win):
         self.quit = False
         self.config = config
-        self.server = lmsquery.LMSQuery(config["ServerIP"], config["ServerPort"])
+        self.loader = Loader()
+        self.loading = {}
+        # Shown over the current screen until the next key press
+        self.errorMessage = None
+        self.searchIndex = SearchIndex()
+        # Counts library loads, so the SearchIndex can ignore superseded ones
+        self.libraryGeneration = 0
+        self.searchResults = []
+        self.searchPosition = 0
+        self.serverSearchQuery = ""
+        self.playlistFingerprint = None
+        # Play queues of the players we've looked at, keyed by player id
+        self.playQueues = {}
+        # Set from the Listener thread when any player changes, or when players
+        # come and go (which matters even off the Players screen)
+        self.playersStale = threading.Event()
+        self.playersChanged = threading.Event()
+        self.server = Connection(config["ServerIP"], config["ServerPort"], config["CLIPort"],
+                                 config["MaxConnections"])
+        self.savedPlaylists = LazyPlaylists(self.server, config["PlaylistLRUSize"],
+                                            self.startLoading)
         self.player = self.getPlayers()
         self.win = win
         (self.height, self.width) = self.win.getmaxyx()
@@ -28,12 +68,13 @@ class Engine:
         self.constructScreens()
         self.constructStatusline()
         self.constructPlaybar()
+        self.constructListener()
 
     def getPlayers(self):
-        players = self.server.get_players()
+        self.players = lmswrapper.get_players(self.server)
         # Upon startup, default to the first player we can find
-        player_choice = players[0]
-        player = LMSPlayer(player_choice['name'], player_choice['playerid'])
+        player_choice = self.players[0]
+        player = LMSPlayer(player_choice.name, player_choice.player_id)
 
         return player
 
@@ -43,23 +84,19 @@ class Engine:
                          screenmaker.make_screen("Playlist", screen_dimensions),
                          screenmaker.make_screen("Media Library", screen_dimensions),
                          screenmaker.make_screen("Saved Playlists", screen_dimensions),
+                         screenmaker.make_screen("Search Results", screen_dimensions),
+                         screenmaker.make_screen("Players", screen_dimensions),
                          screenmaker.make_screen("Test", screen_dimensions)
                        ]
 
-        # We want to load the media library when the program starts
-        self.reloadMediaLibrary()
-        self.win.clear()
-        self.win.refresh()
-
-        # We want to load the user's saved playlists as well
-        self.reloadSavedPlaylists()
-        self.win.clear()
-        self.win.refresh()
-
-        # NOTE: As long as we start on Playlist, load it here
+        # NOTE: As long as we start on Playlist, load it first
         self.currentScreenIndex = 0
         self.reloadPlaylist()
 
+        # We want to load the media library and saved playlists when the program starts
+        self.reloadMediaLibrary(use_cache=True)
+        self.reloadSavedPlaylists()
+        self.showPlayers(self.players)
 
     def getWindowDimensions(self):
         ul = Point(0, 0)
@@ -69,59 +106,419 @@ class Engine:
         return dimensions
 
     def reloadPlaylist(self):
-        # Tell the user we are doing work
-        infobox = Infobox("Fetching Current Playlist...", self.win)
-        infobox.render()
-
-        # Clear the old playlist
-        playlist_screen = self.screens[0]
-        playlist_panel = playlist_screen.getCurrentPanel()
+        # Clear the old playlist, since it may belong to a different player
+        playlist_panel = self.screens[0].getCurrentPanel()
         playlist_panel.clearItems()
+        self.playlistFingerprint = None
+
+        # Fetch the new playlist from LMS in the background
+        self.startLoading("Playlist", self.fetchPlaylist, self.player)
+
+    def fetchPlaylist(self, player):
+        # NOTE: This runs on a Loader thread, so it must not touch any panels
+        page_size = self.config["PlaylistPageSize"]
+        fingerprint = lmswrapper.get_playlist_fingerprint(self.server, player)
+        pages = lmswrapper.iter_current_playlist(self.server, player, page_size)
+        for (songs, num_loaded, num_tracks) in pages:
+            # The fingerprint only describes the playlist once we have all of it
+            complete = num_loaded >= num_tracks
+            yield ((songs, fingerprint if complete else None), num_loaded, num_tracks)
+
+    def syncPlaylist(self, start=0, stop=None, check=False):
+        """
+        Brings the playlist panel up to date with LMS without fetching the whole
+        thing again. Any edit we made ourselves should already be applied to
+        the panel, with start and stop marking the range it could have moved
+        songs around in. If check is set, we first make sure the playlist has
+        changed at all since we last saw it.
+        """
+        if self.playlistFingerprint is None:
+            # We never got the whole playlist in the first place
+            self.reloadPlaylist()
+            return
+
+        playlist = list(self.screens[0].getCurrentPanel().items)
+        known_fingerprint = self.playlistFingerprint if check else None
+        self.startLoading("Playlist", self.fetchPlaylistChanges, self.player,
+                          playlist, start, stop, known_fingerprint)
+
+    def fetchPlaylistChanges(self, player, playlist, start, stop, known_fingerprint):
+        # NOTE: This runs on a Loader thread, so it must not touch any panels
+        fingerprint = lmswrapper.get_playlist_fingerprint(self.server, player)
+        if fingerprint == known_fingerprint:
+            return
+
+        page_size = self.config["PlaylistPageSize"]
+        songs = lmswrapper.sync_playlist(self.server, player, playlist, start, stop,
+                                         fingerprint[0], page_size)
+        yield ((songs, fingerprint), len(songs), len(songs))
+
+    def showPlaylist(self, playlist):
+        (songs, fingerprint) = playlist
+        self.playlistFingerprint = fingerprint
+        if fingerprint is not None:
+            self.playQueues[self.player.player_id] = (songs, fingerprint)
+        paneldriver.replace_items(self.screens[0].getCurrentPanel(), songs)
+        self.showPlayerQueue(fetch=False)
+
+    def switchPlayer(self, player):
+        """
+        We hold on to the play queue of every player we've seen, so switching
+        to one of them shows its queue right away. Then we check with the server
+        in the background, and only fetch what changed since we last saw it.
+        """
+        if player.player_id == self.player.player_id:
+            return
+
+        playlist_panel = self.screens[0].getCurrentPanel()
+        if self.playlistFingerprint is not None:
+            self.playQueues[self.player.player_id] = (list(playlist_panel.items),
+                                                      self.playlistFingerprint)
+        self.player = player
+        self.state.invalidate()
+
+        cached = self.playQueues.get(player.player_id)
+        if cached is None:
+            self.reloadPlaylist()
+            return
+
+        (songs, self.playlistFingerprint) = cached
+        playlist_panel.setItems(list(songs))
+        self.syncPlaylist(check=True)
+
+    def showPlayers(self, players):
+        self.players = players
+        players_panel = self.screens[4].panels[0]
+
+        # Most refreshes find nothing new, so the panel can keep what it drew
+        if ([player.getDetails() for player in players] ==
+            [player.getDetails() for player in players_panel.items]):
+            return
+
+        # Keep the same player highlighted, even if it moved in the list
+        selected_player = None
+        if len(players_panel.items) > 0:
+            selected_player = players_panel.getCurrentItem()
+        paneldriver.replace_items(players_panel, players)
+        if selected_player is not None:
+            index = paneldriver.find_item(players_panel, selected_player)
+            if index is not None:
+                paneldriver.jump_to_item(players_panel, index)
+
+        # Only go looking for a queue if a different player ended up highlighted
+        moved = (selected_player is None or len(players) == 0 or
+                 players_panel.getCurrentItem().player_id != selected_player.player_id)
+        self.showPlayerQueue(fetch=moved)
+
+    def getMarkedPlayers(self):
+        # Marked players only stand in for the connected one on the Players screen
+        if self.getCurrentScreen().title != "Players":
+            return []
+
+        return self.screens[4].panels[0].getMarkedItems()
+
+    def showPlayerQueue(self, fetch=True):
+        """
+        Shows the play queue of the player highlighted on the Players screen.
+        We show our own copy of the queue right away, and if it isn't the
+        connected player's (which we keep up to date already), we catch up on
+        any changes in the background.
+        """
+        (players_panel, queue_panel) = self.screens[4].panels
+        if len(players_panel.items) == 0:
+            queue_panel.clearItems()
+            return
+
+        player = players_panel.getCurrentItem()
+        if player.player_id == self.player.player_id:
+            songs = self.screens[0].getCurrentPanel().items
+            paneldriver.replace_items(queue_panel, list(songs))
+            return
+
+        cached = self.playQueues.get(player.player_id)
+        paneldriver.replace_items(queue_panel, list(cached[0]) if cached else [])
+        if fetch:
+            self.startLoading("Players", self.fetchPlayerQueue, player, cached)
+
+    def fetchPlayerQueue(self, player, cached):
+        # NOTE: This runs on a Loader thread, so it must not touch any panels
+        fingerprint = lmswrapper.get_playlist_fingerprint(self.server, player)
+        if cached is not None and cached[1] == fingerprint:
+            return
+
+        # Songs we already know about are reused, so only the new ones are fetched
+        known_songs = cached[0] if cached else []
+        page_size = self.config["PlaylistPageSize"]
+        songs = lmswrapper.sync_playlist(self.server, player, known_songs, 0, None,
+                                         fingerprint[0], page_size)
+        yield ((player.player_id, songs, fingerprint), len(songs), len(songs))
+
+    def storePlayerQueue(self, queue):
+        (player_id, songs, fingerprint) = queue
+        self.playQueues[player_id] = (songs, fingerprint)
+        self.showPlayerQueue(fetch=False)
+
+    def reloadMediaLibrary(self, use_cache=False):
+        # In lazy mode we only fetch the artists, the rest comes on demand
+        self.mediaLibrary = None
+        if self.config["LazyMediaLibrary"]:
+            self.mediaLibrary = LazyLibrary(self.server, self.config["LibraryLRUSize"],
+                                            self.startLoading)
+
+        # Fetch the new media library in the background
+        self.screens[1].setCurrentPanel(0)
+        self.libraryGeneration += 1
+        self.startLoading("Media Library", self.fetchMediaLibrary, use_cache,
+                          self.libraryGeneration)
+
+    def invalidateMediaLibrary(self):
+        # The library on disk and the one we're showing are both out of date now
+        librarycache.delete_library(librarycache.get_cache_path(self.config))
+        self.reloadMediaLibrary()
 
-        # Fetch the new playlist from LMS
-        current_playlist = lmswrapper.get_current_playlist(self.server, self.player)
-        for song in current_playlist:
-            playlist_panel.addItem(song)
-
-    def reloadMediaLibrary(self):
-        # Tell the user we are doing work
-        infobox = Infobox("Fetching Media Library...", self.win)
-        infobox.render()
-
-        # Clear the old media library
+    def fetchMediaLibrary(self, use_cache, generation):
+        # NOTE: This runs on a Loader thread, so it must not touch any panels
+        page_size = self.config["LibraryPageSize"]
+        if self.config["LazyMediaLibrary"]:
+            artists = lmswrapper.get_artists(self.server, page_size)
+            self.searchIndex.update(artists, generation)
+            yield (artists, len(artists), len(artists))
+            return
+
+        cache_path = librarycache.get_cache_path(self.config)
+        fingerprint = lmswrapper.get_library_fingerprint(self.server)
+
+        # Use the cached media library if the server's library hasn't changed
+        if use_cache:
+            media_library = librarycache.load_library(cache_path, fingerprint)
+            if media_library is not None:
+                artists = list(media_library.values())
+                self.searchIndex.update(artists, generation)
+                yield (artists, len(media_library), len(media_library))
+                return
+
+        # Otherwise fetch it from LMS a page at a time, showing each page as it arrives
+        pages = lmswrapper.iter_media_library(self.server, page_size)
+        for (page, (media_library, changed, num_loaded, num_songs)) in enumerate(pages):
+            # Index each page as it arrives, so searching works while we load.
+            # The first page also clears out whatever the last library left
+            artists = list(media_library.values())
+            if page == 0:
+                self.searchIndex.update(artists, generation)
+            else:
+                (new_artists, new_albums) = changed
+                self.searchIndex.add(new_artists, new_albums, generation)
+            yield (artists, num_loaded, num_songs)
+
+        librarycache.save_library(cache_path, fingerprint, media_library)
+
+    def showMediaLibrary(self, artists):
         media_library_screen = self.screens[1]
-        media_library_panels = media_library_screen.panels
-        for panel in media_library_panels:
+        artist_panel = media_library_screen.panels[0]
+
+        # Keep the same artist highlighted as more of the library comes in
+        selected_artist = None
+        if len(artist_panel.items) > 0:
+            selected_artist = artist_panel.getCurrentItem()
+        artist_panel.setItems(artists)
+        if selected_artist in artists:
+            paneldriver.jump_to_item(artist_panel, artists.index(selected_artist))
+
+        # The highlighted artist's albums and songs may have grown too, even if
+        # the user has moved on to those panels, so refill them in place
+        self.refillMediaPanels()
+
+    def storeLibraryAlbums(self, fetched):
+        # The library may have been reloaded (or stopped being lazy) since
+        if self.mediaLibrary is None:
+            return
+
+        (artist, albums) = fetched
+        self.mediaLibrary.putAlbums(artist, albums)
+        self.refillMediaPanels()
+
+    def storeLibrarySongs(self, fetched):
+        if self.mediaLibrary is None:
+            return
+
+        (album, songs) = fetched
+        self.mediaLibrary.putSongs(album, songs)
+        self.refillMediaPanels()
+
+    def refillMediaPanels(self):
+        (artist_panel, album_panel, song_panel) = self.screens[1].panels
+        if len(artist_panel.items) == 0:
+            album_panel.clearItems()
+            song_panel.clearItems()
+            return
+
+        artist = artist_panel.getCurrentItem()
+        albums = self.mediaLibrary.getAlbums(artist) if self.mediaLibrary else artist.albums
+        paneldriver.refill_items(album_panel, albums)
+        if len(album_panel.items) == 0:
+            song_panel.clearItems()
+            return
+
+        album = album_panel.getCurrentItem()
+        songs = self.mediaLibrary.getSongs(album) if self.mediaLibrary else album.songs
+        paneldriver.refill_items(song_panel, songs)
+
+    def reloadSavedPlaylists(self, refresh=False):
+        # Tracks we already have are kept, unless we were asked to start over
+        if refresh:
+            self.savedPlaylists.clear()
+
+        # Fetch the new list of saved playlists from LMS in the background
+        self.startLoading("Saved Playlists", self.fetchSavedPlaylists)
+
+    def fetchSavedPlaylists(self):
+        # NOTE: This runs on a Loader thread, so it must not touch any panels
+        saved_playlists = lmswrapper.get_saved_playlist_index(self.server)
+        yield (saved_playlists, len(saved_playlists), len(saved_playlists))
+
+    def showSavedPlaylists(self, saved_playlists):
+        saved_playlists_panel = self.screens[2].panels[0]
+
+        # Keep the same playlist highlighted, even if it moved in the list
+        selected_playlist = None
+        if len(saved_playlists_panel.items) > 0:
+            selected_playlist = saved_playlists_panel.getCurrentItem()
+        saved_playlists = self.savedPlaylists.updateIndex(saved_playlists)
+        paneldriver.replace_items(saved_playlists_panel, saved_playlists)
+        if selected_playlist in saved_playlists:
+            paneldriver.jump_to_item(saved_playlists_panel,
+                                     saved_playlists.index(selected_playlist))
+
+        self.showSavedPlaylistSongs()
+
+    def reloadSavedPlaylistSongs(self):
+        # Only the highlighted playlist was edited, so only it is fetched again
+        saved_playlists_panel = self.screens[2].panels[0]
+        if len(saved_playlists_panel.items) > 0:
+            self.savedPlaylists.invalidate(saved_playlists_panel.getCurrentItem())
+        self.showSavedPlaylistSongs()
+
+    def storeSavedPlaylistSongs(self, fetched):
+        (playlist, songs) = fetched
+        self.savedPlaylists.putSongs(playlist, songs)
+        self.showSavedPlaylistSongs()
+
+    def showSavedPlaylistSongs(self):
+        (saved_playlists_panel, tracks_panel) = self.screens[2].panels
+        if len(saved_playlists_panel.items) == 0:
+            tracks_panel.clearItems()
+            return
+
+        playlist = saved_playlists_panel.getCurrentItem()
+        paneldriver.replace_items(tracks_panel, self.savedPlaylists.getSongs(playlist))
+
+    def reloadSearchResults(self, query):
+        # Starting a new search supersedes any search still in flight
+        self.serverSearchQuery = query
+        for panel in self.screens[3].panels:
             panel.clearItems()
-        
-        # Fetch the new media library from LMS
-        media_library = lmswrapper.get_media_library(self.server)
-        for artist in media_library.values():
-            media_library_panels[0].addItem(artist)
+        self.startLoading("Search Results", self.fetchSearchResults, query)
+
+    def fetchSearchResults(self, query):
+        # NOTE: This runs on a Loader thread, so it must not touch any panels
+        if query == "":
+            yield (([], [], []), 0, 0)
+            return
+
+        page_size = self.config["SearchPageSize"]
+        max_results = self.config["SearchMaxResults"]
+        yield from lmswrapper.iter_search_results(self.server, query, page_size, max_results)
+
+    def showSearchResults(self, results):
+        # Keep each panel's highlight where it was as more results come in
+        for (panel, items) in zip(self.screens[3].panels, results):
+            index = panel.curr_item
+            panel.setItems(items)
+            if len(items) > 0:
+                paneldriver.jump_to_item(panel, min(index, len(items) - 1))
+
+    def searchServer(self, query, debouncer):
+        """
+        This is called as the user types a search, and every so often while
+        they pause. We only send the query to the server once they've stopped
+        typing for a moment, and draw whatever has come back so far behind the
+        search box. Returns whether we drew anything.
+        """
+        debouncer.update(query)
+        settled = debouncer.poll()
+        if settled is not None:
+            self.reloadSearchResults(settled)
+
+        if not self.processLoaderUpdates():
+            return False
 
-        media_library_screen.setCurrentPanel(0)
-
-        paneldriver.change_media_panels(self.screens[1])
-
-    def reloadSavedPlaylists(self):
-        # Tell the user we are doing work
-        infobox = Infobox("Fetching Saved Playlists...", self.win)
+        self.renderCurrentScreen()
+        curses.doupdate()
+
+        return True
+
+    def startLoading(self, screen_title, job, *args):
+        # Until the first snapshot comes in, we don't know how much there is
+        self.loading[screen_title] = (0, 0)
+        self.loader.start(screen_title, job, *args)
+
+    def processLoaderUpdates(self):
+        updates = self.loader.getUpdates()
+        for (screen_title, snapshot, error) in updates:
+            if error is not None:
+                # A job that died (e.g. the server went away) shouldn't take us
+                # with it. The Players screen's catch-up fails quietly, like it loads
+                self.loading.pop(screen_title, None)
+                if screen_title in LOADING_MESSAGES:
+                    self.errorMessage = f"Couldn't Load {screen_title} From the Server"
+                continue
+            if snapshot is None:
+                # The job is finished
+                del self.loading[screen_title]
+                continue
+
+            (items, num_loaded, num_total) = snapshot
+            self.loading[screen_title] = (num_loaded, num_total)
+            if screen_title == "Playlist":
+                self.showPlaylist(items)
+            elif screen_title == "Media Library":
+                self.showMediaLibrary(items)
+            elif screen_title == "Saved Playlists":
+                self.showSavedPlaylists(items)
+            elif screen_title == "Library Albums":
+                self.storeLibraryAlbums(items)
+            elif screen_title == "Library Songs":
+                self.storeLibrarySongs(items)
+            elif screen_title == "Saved Playlist Tracks":
+                self.storeSavedPlaylistSongs(items)
+            elif screen_title == "Search Results":
+                self.showSearchResults(items)
+            elif screen_title == "Players":
+                self.storePlayerQueue(items)
+
+        return len(updates) > 0
+
+    def renderLoadingMessage(self):
+        # Only show progress for the screen the user is looking at. The Players
+        # screen catches up on play queues quietly, so it has no message
+        screen_title = self.getCurrentScreen().title
+        if screen_title not in self.loading or screen_title not in LOADING_MESSAGES:
+            return
+
+        message = LOADING_MESSAGES[screen_title]
+        (num_loaded, num_total) = self.loading[screen_title]
+        if 0 < num_total and num_loaded < num_total:
+            message += f" ({num_loaded} of {num_total} Tracks)"
+
+        infobox = Infobox(message, self.win)
         infobox.render()
 
-        # Clear the old list of saved playlists
-        saved_playlists_screen = self.screens[2]
-        saved_playlists_panels = saved_playlists_screen.panels
-        for panel in saved_playlists_panels:
-            panel.clearItems()
-
-        # Fetch the new saved playlists from LMS
-        saved_playlists = lmswrapper.get_saved_playlists(self.server)
-        for playlist in saved_playlists:
-            saved_playlists_panels[0].addItem(playlist)
-
-        saved_playlists_screen.setCurrentPanel(0)
+    def renderErrorMessage(self):
+        if self.errorMessage is None:
+            return
 
-        paneldriver.change_saved_playlist_panel(self.screens[2])
+        infobox = Infobox(self.errorMessage, self.win)
+        infobox.render()
 
     def getCurrentScreen(self):
         return self.screens[self.currentScreenIndex]
@@ -156,31 +553,163 @@ class Engine:
         new_dimensions = self.getPlaybarDimensions()
         self.playbar.resize(new_dimensions)
 
+    def constructListener(self):
+        self.state = PlayerState()
+        self.scheduler = Scheduler(self.config["PollIntervals"], self.config["PollBackoffs"],
+                                   self.config["IdleTimeout"])
+        # We already have the players from startup
+        self.scheduler.markDone(['Players'])
+        # The Listener hands rescan notifications to the monitor, so it has to exist first
+        intervals = self.config["PollIntervals"]
+        self.rescanMonitor = RescanMonitor(self.server, intervals["Rescan"],
+                                           intervals["RescanMax"], intervals["RescanActive"])
+        self.rescanMonitor.start()
+        self.listener = Listener(self.config["ServerIP"], self.config["CLIPort"],
+                                 self.handleNotification)
+        self.listener.start()
+
+    def handleNotification(self, notification):
+        # NOTE: This is called from the Listener's thread, so only flag the state
+        source = notification[0]
+        if source == "rescan":
+            self.rescanMonitor.wake()
+            return
+
+        # Anything a player does might change how it shows up on the Players screen
+        self.playersStale.set()
+        if len(notification) > 1 and notification[1] == "client":
+            self.playersChanged.set()
+        if source == self.player.player_id:
+            self.state.invalidate()
+
+    def refreshPlayerState(self):
+        """
+        The Scheduler tells us which sources are due, and we fetch them all at
+        once. Anything the Listener tells us about (track changes, seeks,
+        pauses, etc) marks the player state stale, which makes it due right
+        away. The server doesn't notify us about the elapsed time of a playing
+        track, so we count that forward ourselves in between.
+
+        Returns whether the Players screen changed, since the Statusline and
+        Playbar aren't the only things that need redrawing then.
+        """
+        if self.state.isStale():
+            self.state.markFresh()
+            self.scheduler.markDue('Status', 'NowPlaying')
+        if self.state.isPlaying() and self.state.trackEnded():
+            self.scheduler.markDue('NowPlaying')
+        # Off the Players screen, player changes wait for the (slower) schedule
+        players_shown = self.getCurrentScreen().title == "Players"
+        if self.playersChanged.is_set() or (players_shown and self.playersStale.is_set()):
+            self.playersChanged.clear()
+            self.playersStale.clear()
+            self.scheduler.markDue('Players')
+
+        due = self.scheduler.getDue(self.getPollConditions())
+        updates = {}
+        if due:
+            updates = lmswrapper.get_source_updates(self.server, self.player, due)
+            if 'Status' in updates:
+                # Both sources are answered by the same status query
+                due |= {'Status', 'NowPlaying'}
+            self.scheduler.markDone(due)
+
+        if 'Status' in updates:
+            # One query covers both the Statusline and the Playbar
+            (player_info, track_info) = updates['Status']
+            self.state.updatePlayerInfo(player_info)
+            self.state.updateTrackInfo(track_info)
+        else:
+            self.state.advanceElapsedTime()
+        players_changed = 'Players' in updates
+        if players_changed:
+            self.showPlayers(updates['Players'])
+
+        # The RescanMonitor checks on rescans by itself, we just pick up the news
+        if self.rescanMonitor.updated.is_set():
+            self.rescanMonitor.updated.clear()
+            self.state.updateScanInfo(self.rescanMonitor.getStatus())
+        if self.rescanMonitor.finished.is_set():
+            self.rescanMonitor.finished.clear()
+            self.invalidateMediaLibrary()
+
+        return players_changed
+
+    def getPollConditions(self):
+        conditions = set()
+        if self.state.isPoweredOff():
+            conditions.add('Off')
+        elif not self.state.isPlaying():
+            conditions.add('Paused')
+        if self.scheduler.isIdle():
+            conditions.add('Idle')
+        if self.listener.connected:
+            conditions.add('Listening')
+        if self.getCurrentScreen().title != "Players":
+            conditions.add('Hidden')
+
+        return conditions
+
     def run(self):
+        key = None
         while(not self.quit):
-            self.renderAll()
+            refreshed = self.refreshPlayerState()
+            loaded = self.processLoaderUpdates()
+            if key == -1 and not loaded and not refreshed:
+                # Nothing was pressed, loaded or refreshed, so only redraw the bars
+                self.renderChanges()
+            else:
+                self.renderAll()
+                self.renderLoadingMessage()
+                self.renderErrorMessage()
             key = self.getInput()
-            self.handleInput(key)
+            if key != -1:
+                self.errorMessage = None
+                # Most other commands change the player's state, so check it next frame
+                if key not in NAVIGATION_KEYS:
+                    self.state.invalidate()
+                self.scheduler.touch()
+                self.handleInput(key)
+
+        self.listener.stop()
+        self.rescanMonitor.stop()
+        self.server.close()
 
     def renderAll(self):
+        """
+        Boxes and other screens may have drawn over our windows since the last
+        frame, so we have curses repaint all of them. Panels whose contents
+        haven't changed skip drawing and just hand curses what they already
+        have, and curses only sends the cells that differ to the terminal.
+        """
+        self.statusline.touch()
+        self.getCurrentScreen().touch()
+        self.playbar.touch()
+
         self.renderStatusline()
         self.renderCurrentScreen()
         self.renderPlaybar()
+        curses.doupdate()
+
+    def renderChanges(self):
+        if self.state.playerInfoChanged:
+            self.renderStatusline()
+        if self.state.trackInfoChanged:
+            self.renderPlaybar()
+        curses.doupdate()
 
     def renderStatusline(self):
-        # Fetch status info for current player
-        player_info = lmswrapper.get_player_info(self.server, self.player)
         # Statusline needs player info, as well as our current mode
-        self.statusline.render(player_info, self.mode)
+        self.statusline.render(self.state.player_info, self.mode)
+        self.state.playerInfoChanged = False
 
     def renderCurrentScreen(self):
         current_screen = self.getCurrentScreen()
         current_screen.render()
 
     def renderPlaybar(self):
-        # Fetch info for the currently playing track
-        track_info = lmswrapper.get_now_playing(self.server, self.player)
-        self.playbar.render(track_info)
+        self.playbar.render(self.state.track_info)
+        self.state.trackInfoChanged = False
 
     def getInput(self):
         current_panel = self.getCurrentScreen().getCurrentPanel()
@@ -202,6 +731,14 @@ class Engine:
             if self.currentScreenIndex == 2:
                 inputhandler.handle_saved_playlist_commands(self, key)
 
+            """ SEARCH RESULTS COMMANDS """
+            if self.currentScreenIndex == 3:
+                inputhandler.handle_search_results_commands(self, key)
+
+            """ PLAYERS COMMANDS """
+            if self.currentScreenIndex == 4:
+                inputhandler.handle_players_commands(self, key)
+
             """ GENERIC COMMANDS """
             inputhandler.handle_generic_commands(self, key)
         elif self.mode == Mode.MOVE:
@@ -2,7 +2,8 @@
 A Form is a single-line input field that can be embedded into a prompt-like
 window, effectively creating a little editor to type strings into.
 
-This is how we get the names of new/edited playlists from the user.
+This is how we get the names of new/edited playlists from the user, as well as
+search queries.
 """
 
 import curses
@@ -10,6 +11,9 @@ import curses
 import draw
 from util import Point
 
+# How often (in ms) we check back with the caller while waiting on keystrokes
+CHANGE_INTERVAL = 50
+
 class Form:
     def __init__(self, origin, length, prompt=""):
         self.origin = origin
@@ -59,14 +63,24 @@ class Form:
     def removeCharFromBuffer(self):
         self.buffer = self.buffer[:len(self.buffer) - 1]
 
-    def edit(self):
+    def edit(self, on_change=None):
+        """
+        If we're given an on_change function, it gets called with the buffer
+        after every keystroke, and every so often while the user isn't typing,
+        so the caller can react to what is typed without blocking the editor.
+        """
         # Make the cursor visible while typing
         curses.curs_set(1)
+        if on_change is not None:
+            self.win.timeout(CHANGE_INTERVAL)
 
         while True:
             self.render()
             ch = self.win.getch()
-            if ch == 10: # Enter
+            if ch == -1:
+                # Nothing was typed in time
+                pass
+            elif ch == 10: # Enter
                 # Submit the current buffer
                 curses.curs_set(0)
                 return (self.trimWhitespace(self.buffer), 1)
@@ -81,6 +95,9 @@ class Form:
                 # Handle characters as input
                 self.handleInput(ch)
 
+            if on_change is not None:
+                on_change(self.buffer)
+
     def handleInput(self, ch):
         if ch == curses.KEY_BACKSPACE or ch == 127: # Backspace key
             self.removeCharFromBuffer()
@@ -0,0 +1,129 @@
+"""
+A LazyLibrary stands in for the full media library when it's too big to
+download up front. We start out knowing only the artists, then fetch an
+artist's albums or an album's songs the first time the user looks at them.
+
+Recently viewed albums and songs are kept in LRU caches, so flipping back and
+forth between artists doesn't go back to the server every time.
+
+LazyPlaylists does the same for saved playlists. Only the list of playlists is
+fetched up front, and each playlist's tracks are fetched when it's highlighted.
+Editing a playlist marks just that playlist's tracks stale. We keep showing
+them until the fresh ones come in, so the highlight doesn't jump around.
+
+Fetches run on the Engine's Loader, which we're handed as a load function. A
+lookup that misses starts one and hands back what we have for now (usually
+nothing), and the Engine puts the results in once they arrive.
+"""
+
+import lmswrapper
+from util import LRUCache
+
+class LazyLibrary:
+    def __init__(self, lms, cache_size, load):
+        self.lms = lms
+        self.load = load
+        self.albums = LRUCache(cache_size)
+        self.songs = LRUCache(cache_size)
+        # The artist and album whose contents are on their way
+        self.pendingArtist = None
+        self.pendingAlbum = None
+
+    def getAlbums(self, artist):
+        albums = self.albums.get(artist.artist_id)
+        if albums is None and self.pendingArtist != artist.artist_id:
+            self.pendingArtist = artist.artist_id
+            self.load("Library Albums", self.fetchAlbums, artist)
+
+        return albums if albums is not None else []
+
+    def getSongs(self, album):
+        songs = self.songs.get(album.album_id)
+        if songs is None and self.pendingAlbum != album.album_id:
+            self.pendingAlbum = album.album_id
+            self.load("Library Songs", self.fetchSongs, album)
+
+        return songs if songs is not None else []
+
+    def fetchAlbums(self, artist):
+        # NOTE: This runs on a Loader thread, so it only hands the albums back
+        albums = lmswrapper.get_artist_albums(self.lms, artist)
+        yield ((artist, albums), len(albums), len(albums))
+
+    def fetchSongs(self, album):
+        # NOTE: This runs on a Loader thread, so it only hands the songs back
+        songs = lmswrapper.get_album_songs(self.lms, album)
+        yield ((album, songs), len(songs), len(songs))
+
+    def putAlbums(self, artist, albums):
+        if self.pendingArtist == artist.artist_id:
+            self.pendingArtist = None
+        self.albums.put(artist.artist_id, albums)
+
+    def putSongs(self, album, songs):
+        if self.pendingAlbum == album.album_id:
+            self.pendingAlbum = None
+        self.songs.put(album.album_id, songs)
+
+class LazyPlaylists:
+    def __init__(self, lms, cache_size, load):
+        self.lms = lms
+        self.load = load
+        self.playlists = {}
+        self.songs = LRUCache(cache_size)
+        self.stale = set()
+        # The playlist whose tracks are on their way, so we don't ask twice
+        self.pending = None
+
+    def updateIndex(self, playlists):
+        """
+        Takes a freshly fetched list of playlists, and hands back our own copy
+        of it. Playlists we already know keep their object (with the new name),
+        and anything that disappeared is dropped along with its tracks.
+        """
+        index = {}
+        for playlist in playlists:
+            known = self.playlists.get(playlist.playlist_id)
+            if known is None:
+                known = playlist
+            known.name = playlist.name
+            index[playlist.playlist_id] = known
+
+        for playlist_id in self.playlists.keys() - index.keys():
+            self.songs.remove(playlist_id)
+            self.stale.discard(playlist_id)
+        self.playlists = index
+
+        return list(index.values())
+
+    def getSongs(self, playlist):
+        playlist_id = playlist.playlist_id
+        songs = self.songs.get(playlist_id)
+        if (songs is None or playlist_id in self.stale) and self.pending != playlist_id:
+            self.pending = playlist_id
+            self.load("Saved Playlist Tracks", self.fetchSongs, playlist)
+
+        return songs if songs is not None else []
+
+    def fetchSongs(self, playlist):
+        # NOTE: This runs on a Loader thread, so it only hands the tracks back
+        songs = lmswrapper.get_saved_playlist_songs(self.lms, playlist)
+        yield ((playlist, songs), len(songs), len(songs))
+
+    def putSongs(self, playlist, songs):
+        if self.pending == playlist.playlist_id:
+            self.pending = None
+        self.stale.discard(playlist.playlist_id)
+        self.songs.put(playlist.playlist_id, songs)
+
+    def invalidate(self, playlist):
+        self.stale.add(playlist.playlist_id)
+        # Tracks already on their way may be from before the edit
+        if self.pending == playlist.playlist_id:
+            self.pending = None
+
+    def clear(self):
+        self.playlists = {}
+        self.songs.clear()
+        self.stale = set()
+        self.pending = None
@@ -0,0 +1,127 @@
+"""
+The Listener keeps a connection open to the LMS command line interface (CLI)
+and waits for the server to tell us when something happens, that way we don't
+have to keep asking the server whether anything has changed.
+"""
+
+import socket
+import threading
+import time
+from urllib.parse import unquote
+
+"""
+These are the notification types we subscribe to. Between them they cover
+everything the Statusline and Playbar care about: player state, volume, the
+play queue, player names, and server rescans.
+"""
+
+SUBSCRIPTIONS = "client,mixer,name,pause,play,playlist,power,prefset,rescan,stop,time"
+RECONNECT_DELAY = 5
+
+"""
+A connection can die without either end hearing about it (the server reboots,
+or the Wi-Fi drops), which would leave us waiting on it forever. So if the
+server has been quiet for a while we ping it, and if it doesn't answer in
+the same amount of time we give up on the connection and start over.
+"""
+PING_INTERVAL = 30
+PING_COMMAND = "listen ?"
+
+class Listener:
+    def __init__(self, host, port, callback, ping_interval=PING_INTERVAL):
+        self.host = host
+        self.port = int(port)
+        self.callback = callback
+        self.pingInterval = ping_interval
+        self.connected = False
+        self.running = False
+        self.sock = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.listen, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.disconnect()
+
+    def listen(self):
+        while self.running:
+            try:
+                self.connect()
+                self.readNotifications()
+            except OSError:
+                pass
+            self.disconnect()
+
+            # The server went away, so wait a moment before trying again
+            if self.running:
+                time.sleep(RECONNECT_DELAY)
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.pingInterval)
+        self.sock = sock
+        # Let the OS check on the link too, in case it outlives our pings
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.sendall(f"subscribe {SUBSCRIPTIONS}\n".encode('utf-8'))
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def readNotifications(self):
+        """
+        Notifications arrive one per line, until the server hangs up on us. A
+        timeout while we're waiting on a ping is raised as an OSError, same as
+        any other way of losing the connection.
+        """
+        # stop() can take self.sock away from us at any moment, so hold on to it
+        sock = self.sock
+        buffer = b""
+        pinged = False
+        while self.running:
+            try:
+                data = sock.recv(4096)
+            except socket.timeout:
+                if pinged:
+                    raise
+                sock.sendall(f"{PING_COMMAND}\n".encode('utf-8'))
+                pinged = True
+                continue
+
+            if data == b"":
+                return
+            # Anything at all from the server means it's still there
+            pinged = False
+
+            (*lines, buffer) = (buffer + data).split(b"\n")
+            for line in lines:
+                tokens = parse_notification(line)
+                # The server echoes our subscribe command and pings back, so skip them
+                if tokens == [] or tokens[0] in ("subscribe", "listen"):
+                    continue
+
+                # A notification we choked on shouldn't stop us hearing the rest
+                try:
+                    self.callback(tokens)
+                except Exception:
+                    pass
+
+"""
+CLI lines are a space separated list of URL-encoded tokens. Player specific
+notifications start with the player's ID (its MAC address), while server-wide
+ones (like "rescan done") start with the command itself.
+"""
+def parse_notification(line):
+    text = line.decode('utf-8', errors='replace').strip()
+    if text == "":
+        return []
+
+    return [unquote(token) for token in text.split(' ')]
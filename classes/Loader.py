@@ -0,0 +1,68 @@
+"""
+The Loader runs slow fetches (playlists, the media library, etc) on background
+threads, so the Engine can keep drawing and handling input while they work.
+
+A job is a generator that yields snapshots of whatever it has loaded so far.
+Those snapshots are passed back to the Engine through a thread-safe queue, and
+the Engine picks them up between frames. Jobs never touch curses themselves.
+"""
+
+import queue
+import threading
+
+class Loader:
+    def __init__(self):
+        self.updates = queue.Queue()
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def start(self, name, job, *args):
+        """
+        Starting a job under a name that is already loading supersedes the old
+        job. It stops at its next snapshot, and anything it already queued up
+        is thrown away when the Engine collects it.
+        """
+        with self.lock:
+            generation = self.generations.get(name, 0) + 1
+            self.generations[name] = generation
+
+        thread = threading.Thread(target=self.runJob, args=(name, generation, job, args),
+                                  daemon=True)
+        thread.start()
+
+    def isCurrent(self, name, generation):
+        with self.lock:
+            return self.generations.get(name) == generation
+
+    def runJob(self, name, generation, job, args):
+        try:
+            for snapshot in job(*args):
+                if not self.isCurrent(name, generation):
+                    return
+                self.updates.put((name, generation, snapshot, None))
+        except Exception as error:
+            # Hand the error to the main thread, so it isn't silently lost
+            self.updates.put((name, generation, None, error))
+            return
+
+        # A snapshot of None tells the Engine the job is done
+        self.updates.put((name, generation, None, None))
+
+    def getUpdates(self):
+        """
+        Returns (name, snapshot, error) for everything current jobs have sent
+        back since we last checked. A job that failed sends its exception
+        instead of a snapshot, and nothing else after it.
+        """
+        updates = []
+        while True:
+            try:
+                (name, generation, snapshot, error) = self.updates.get_nowait()
+            except queue.Empty:
+                break
+
+            if not self.isCurrent(name, generation):
+                continue
+            updates.append((name, snapshot, error))
+
+        return updates
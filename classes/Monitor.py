@@ -0,0 +1,99 @@
+"""
+The RescanMonitor keeps an eye on server rescans from a background thread, that
+way the Statusline doesn't have to ask the server about them every frame.
+
+Rescans don't happen often, so while nothing is going on we check in slowly,
+and slow down further every time we find nothing. Once a scan starts (or we
+start one ourselves) we check in often, so the progress shown stays current.
+When a scan finishes, the Engine is told so it can throw out the library.
+"""
+
+import threading
+import time
+
+import lmswrapper
+
+# After asking for a rescan, give the server this long to start one before we
+# assume it came and went between checks
+WATCH_GRACE_PERIOD = 10
+
+class RescanMonitor:
+    def __init__(self, lms, idle_interval, max_idle_interval, active_interval):
+        self.lms = lms
+        self.idleInterval = idle_interval
+        self.maxIdleInterval = max_idle_interval
+        self.activeInterval = active_interval
+        self.interval = idle_interval
+        self.scanning = False
+        self.progress = None
+        self.watchingSince = None
+        self.running = False
+        self.lock = threading.Lock()
+        # Set from this thread, and picked up by the Engine between frames
+        self.updated = threading.Event()
+        self.finished = threading.Event()
+        self.wakeup = threading.Event()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.monitor, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    def wake(self):
+        # Something hinted at a rescan, so check right away
+        self.interval = self.idleInterval
+        self.wakeup.set()
+
+    def watch(self):
+        # We just asked for a rescan, so keep a close eye out for it
+        with self.lock:
+            self.watchingSince = time.monotonic()
+        self.wake()
+
+    def monitor(self):
+        while self.running:
+            try:
+                (scanning, progress) = lmswrapper.get_rescan_progress(self.lms)
+                self.update(scanning, progress)
+            except Exception:
+                # The server went away or sent us something odd, so try again
+                # later rather than giving up on rescans for good
+                pass
+
+            self.wakeup.wait(self.getInterval())
+            self.wakeup.clear()
+
+    def update(self, scanning, progress):
+        with self.lock:
+            was_scanning = self.scanning or self.watchingSince is not None
+            if scanning:
+                self.watchingSince = None
+            elif self.watchingSince is not None:
+                if time.monotonic() - self.watchingSince < WATCH_GRACE_PERIOD:
+                    # The scan we asked for hasn't started yet
+                    return
+                self.watchingSince = None
+
+            if (scanning, progress) != (self.scanning, self.progress):
+                (self.scanning, self.progress) = (scanning, progress)
+                self.updated.set()
+            if was_scanning and not scanning:
+                self.finished.set()
+
+    def getInterval(self):
+        with self.lock:
+            if self.scanning or self.watchingSince is not None:
+                return self.activeInterval
+
+        # Every quiet check makes the next one come later
+        interval = self.interval
+        self.interval = min(self.interval * 2, self.maxIdleInterval)
+        return interval
+
+    def getStatus(self):
+        with self.lock:
+            return { 'scan_status': self.scanning, 'scan_progress': self.progress }
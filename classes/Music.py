@@ -1,9 +1,24 @@
 """
 This series of classes are used to represent albums, songs, and other
 structures and their metadata in the LMS.
+
+A big library has a lot of these, so they use __slots__ instead of a __dict__
+per object, and the strings that repeat across many songs (artists, albums,
+ids) are interned so every song shares a single copy of each.
 """
 
+import sys
+from operator import attrgetter
+
+INTERNED_NUMBERS = {}
+
+# Albums are listed by release, and songs by where they are on the album
+ALBUM_ORDER = attrgetter('year', 'title')
+SONG_ORDER = attrgetter('disc', 'tracknum')
+
 class LMSPlayer:
+    __slots__ = ('name', 'player_id')
+
     def __init__(self, name, player_id):
         self.name = name
         self.player_id = player_id
@@ -11,7 +26,41 @@ class LMSPlayer:
     def __repr__(self):
         return self.name
 
+"""
+A PlayerStatus is what the server tells us about one of its players as a
+whole, without asking the player itself, as shown on the Players dashboard.
+"""
+class PlayerStatus:
+    __slots__ = ('player_id', 'name', 'model', 'connected', 'power', 'playing', 'sync_group')
+
+    def __init__(self, player_id, name, model, connected, power, playing, sync_group=0):
+        self.player_id = player_id
+        self.name = name
+        self.model = model
+        self.connected = int(connected or 0) == 1
+        self.power = int(power or 0) == 1
+        self.playing = int(playing or 0) == 1
+        # Players synced together share a group number, which is 0 when unsynced
+        self.sync_group = sync_group
+
+    def getState(self):
+        if not self.connected:
+            return "Disconnected"
+        if not self.power:
+            return "Off"
+
+        return "Playing" if self.playing else "Stopped"
+
+    def getDetails(self):
+        # Everything the dashboard shows, to tell whether a refresh changed anything
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return self.name
+
 class Playlist:
+    __slots__ = ('playlist_id', 'name', 'songs')
+
     def __init__(self, playlist_id, name, songs):
         self.playlist_id = playlist_id
         self.name = name
@@ -24,49 +73,66 @@ class Playlist:
         return self.name
 
 class Artist:
+    __slots__ = ('artist_id', 'name', 'albums')
+
     def __init__(self, artist_id, name, albums):
-        self.artist_id = artist_id
-        self.name = name
+        self.artist_id = intern(artist_id)
+        self.name = intern(name)
         self.albums = albums
 
     def addAlbum(self, album):
-        index = 0
-        for i in range(len(self.albums)):
-            a = self.albums[i]
-            if album.year < a.year:
-                break
-            index += 1
-        self.albums.insert(index, album)
+        # Albums go in as they come, call sortAlbums() once they're all in
+        self.albums.append(album)
+
+    def sortAlbums(self):
+        self.albums.sort(key=ALBUM_ORDER)
 
     def __repr__(self):
         return self.name
 
 class Album:
+    __slots__ = ('album_id', 'artist', 'artist_id', 'title', 'year', 'songs')
+
     def __init__(self, album_id, artist, artist_id, title, year, songs):
-        self.album_id = album_id
-        self.artist = artist
-        self.artist_id = artist_id
-        self.title = title
-        self.year = year
+        self.album_id = intern(album_id)
+        self.artist = intern(artist)
+        self.artist_id = intern(artist_id)
+        self.title = intern(title)
+        self.year = intern(year)
         self.songs = songs
 
     def addSong(self, song):
-        index = min(len(self.songs), song.tracknum - 1)
-        self.songs.insert(index, song)
+        # Songs go in as they come, call sortSongs() once they're all in
+        self.songs.append(song)
+
+    def sortSongs(self):
+        self.songs.sort(key=SONG_ORDER)
 
     def __repr__(self):
         return self.title
 
 class Song:
-    def __init__(self, song_id, title, artist, artist_id, album_title, album_id, year, tracknum):
+    __slots__ = ('song_id', 'title', 'artist', 'artist_id', 'album_title', 'album_id', 'year',
+                 'tracknum', 'disc')
+
+    def __init__(self, song_id, title, artist, artist_id, album_title, album_id, year, tracknum,
+                 disc=1):
         self.song_id = song_id
         self.title = title
-        self.artist = artist
-        self.artist_id = artist_id
-        self.album_title = album_title
-        self.album_id = album_id
-        self.year = year
+        self.artist = intern(artist)
+        self.artist_id = intern(artist_id)
+        self.album_title = intern(album_title)
+        self.album_id = intern(album_id)
+        self.year = intern(year)
         self.tracknum = int(tracknum)
+        self.disc = int(disc or 1)
 
     def __repr__(self):
         return self.title
+
+def intern(value):
+    # Ids and years can come back from the LMS as numbers, which get shared too
+    if isinstance(value, str):
+        return sys.intern(value)
+
+    return INTERNED_NUMBERS.setdefault(value, value)
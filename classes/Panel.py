@@ -3,9 +3,9 @@ This is where we keep all our Panel classes/subclasses.
 """
 
 import curses
-import unicodedata
 
 import draw
+import textwidth
 from util import Mode, Point, get_color_pair
 
 """
@@ -13,6 +13,10 @@ A Panel is a container for an arbitrary set of information. Since this will
 serve as the "abstract" baseclass, it has no idea how to render itself, though
 it does have some basic draw functions that subclasses will call on if they
 don't implement their own.
+
+Panels only stage their changes with noutrefresh(). The Engine pushes every
+staged change to the terminal at once with curses.doupdate(), and panels keep
+track of what they last drew so they can skip drawing when nothing changed.
 """
 
 class Panel:
@@ -27,13 +31,15 @@ class Panel:
         self.width = lr.x - ul.x
         self.height = lr.y - ul.y
         self.win = curses.newwin(self.height, self.width, self.y, self.x)
+        # A brand new window has nothing drawn on it yet
+        self.renderedState = None
 
     def clearScreen(self):
-        # Fill each cell with the empty character
-        for i in range(self.height - 1):
-            for j in range(self.width):
-                p = Point(i, j)
-                draw.char(p, " ", self.win)
+        self.win.erase()
+
+    def touch(self):
+        # Make curses repaint the whole window, in case something drew over it
+        self.win.touchwin()
 
     def drawTitleLine(self):
         ul = Point(0, 0)
@@ -82,7 +88,7 @@ class DummyPanel(Panel):
         self.drawTitleLine()
         self.drawTitle()
         self.drawBottomLine()
-        self.win.refresh()
+        self.win.noutrefresh()
 
 """
 The Playbar is the constant panel of information about the currently playing
@@ -105,44 +111,33 @@ class Playbar(Panel):
         self.win.timeout(INPUT_TIMEOUT)
 
     def render(self, track_info):
-        self.clearScreen()
-        if track_info != {}:
-            self.drawProgressBar(track_info['duration'], track_info['elapsed_time'])
-        self.drawBottomLine()
-        if track_info != {}:
-            self.drawTrackInfo(track_info)
-        self.win.refresh()
-
-    def clearScreen(self):
-        # Fill each cell with the empty character
-        for i in range(self.height):
-            for j in range(self.width - 1):
-                p = Point(i, j)
-                draw.char(p, " ", self.win)
+        if track_info != self.renderedState:
+            self.clearScreen()
+            if track_info != {}:
+                self.drawProgressBar(track_info['duration'], track_info['elapsed_time'])
+            self.drawBottomLine()
+            if track_info != {}:
+                self.drawTrackInfo(track_info)
+            self.renderedState = track_info
+        self.win.noutrefresh()
 
     def drawProgressBar(self, total_time, elapsed_time):
         percentage = elapsed_time / max(1, total_time)
         full_width = self.width - 2
         num_blocks = min(full_width, round(full_width * percentage))
-        num_spaces = full_width - (num_blocks + 1) # Leave room for playhead
 
         attr = curses.A_ALTCHARSET | get_color_pair("Playbar")
         self.win.attron(attr)
 
         # Draw blocks
-        for i in range(num_blocks):
-            p = Point(0, i + 1)
-            draw.char(p, curses.ACS_CKBOARD, self.win)
+        if num_blocks > 0:
+            self.win.hline(0, 1, curses.ACS_CKBOARD | attr, num_blocks)
 
         # Draw playhead
         p = Point(0, min(full_width + 1, num_blocks))
         draw.char(p, curses.ACS_CKBOARD, self.win)
 
-        # Draw spaces
-        for i in range(num_spaces):
-            p = Point(0, min(full_width + 1, num_blocks + i))
-            draw.char(p, " ", self.win)
-
+        # The rest of the bar was already blanked by clearScreen
         self.win.attroff(attr)
 
     def drawTrackInfo(self, track_info):
@@ -168,8 +163,8 @@ class Playbar(Panel):
         # Draw track info
         # This gets truncated if it is too long
         info_string = f"{title} - {artist} - {album} ({year})"
-        if len(info_string) >= self.width - (len(leader) + len(time_string) + 2):
-            info_string = info_string[:self.width - (len(leader) + len(time_string) + 5)]
+        if textwidth.string_width(info_string) >= self.width - (len(leader) + len(time_string) + 2):
+            info_string = textwidth.truncate(info_string, self.width - (len(leader) + len(time_string) + 5))
             info_string += "..."
         info_point = Point(self.height - 1, len(leader))
         draw.string(info_point, info_string, self.win)
@@ -199,16 +194,18 @@ class Statusline(Panel):
         super().__init__(statusline_dimensions, title)
 
     def render(self, player_info, engine_mode):
-        self.clearScreen()
-        self.drawPlayerInfo(player_info)
-        self.drawModeIndicator(engine_mode)
-        self.win.refresh()
+        state = (player_info, engine_mode)
+        if state != self.renderedState:
+            self.clearScreen()
+            self.drawPlayerInfo(player_info)
+            self.drawModeIndicator(engine_mode)
+            self.renderedState = state
+        self.win.noutrefresh()
 
     def clearScreen(self):
-        # Fill each cell with the empty character
-        left = Point(0, 0)
-        right = Point(0, self.width - 1)
-        draw.h_line(left, right, " ", self.win)
+        # We only ever draw on the first line
+        self.win.move(0, 0)
+        self.win.clrtoeol()
 
     def drawPlayerInfo(self, player_info):
         """
@@ -216,6 +213,7 @@ class Statusline(Panel):
         - player_name
         - power (is the player powered on?)
         - rescan status (is the server rescanning?)
+        - rescan progress (which step is it on, and how far along?)
         *These next ones only return if the player is powered*
         - mixer_volume (render a volume bar)
         - mode (play, pause, etc)
@@ -248,6 +246,8 @@ class Statusline(Panel):
             self.win.attron(curses.A_BOLD)
             self.drawStatusPiece("RESCANNING...")
             self.win.attroff(curses.A_BOLD)
+            if player_info['scan_progress'] is not None:
+                self.drawStatusPiece(f"({player_info['scan_progress']})")
 
         if power_state == "ON":
             mixer_volume = player_info['mixer volume']
@@ -372,8 +372,14 @@ def translate_mode(mode):
 """
 A ListPanel is a panel that specifically contains some list of information, and
 will display/interact with that list via the user's commands.
+
+Lists can get very long, so we only ever format the items that are actually on
+screen (plus a few rows either side, so scrolling doesn't have to format them
+on the spot). The formatted lines are cached until the items or size change.
 """
 
+LIST_OVERSCAN = 10
+
 class ListPanel(Panel):
     def __init__(self, panel_dimensions, title=""):
         super().__init__(panel_dimensions, title)
@@ -382,42 +388,87 @@ class ListPanel(Panel):
         self.l_item = min(len(self.items), self.height - 1)
         self.curr_item = 0
         self.focused = False
+        self.lineCache = {}
+        # Bumped whenever the items (or how they're formatted) change
+        self.itemsVersion = 0
+        self.letterIndex = None
 
     def render(self):
-        self.clearScreen()
-        self.drawTitleLine()
-        self.drawTitle()
-        self.drawItems()
+        """
+        We split what's on screen into the frame (which items are showing) and
+        the highlights (which of those rows are picked out). If only the
+        highlights changed since the last render, we just redraw those rows.
+        """
+        state = (self.getFrameState(), self.getHighlightState())
+        if self.renderedState is None or state[0] != self.renderedState[0]:
+            self.clearScreen()
+            self.drawTitleLine()
+            self.drawTitle()
+            self.drawItems()
+            self.clearSides()
+            self.drawIndicators()
+            self.drawBottomLine()
+        elif state[1] != self.renderedState[1]:
+            self.drawRows(self.getChangedRows(self.renderedState[1], state[1]))
+        self.renderedState = state
+        self.win.noutrefresh()
+
+    def getFrameState(self):
+        return (self.itemsVersion, len(self.items), self.f_item, self.l_item, self.focused)
+
+    def getHighlightState(self):
+        return self.curr_item
+
+    def getChangedRows(self, old_highlights, new_highlights):
+        return {old_highlights, new_highlights}
+
+    def drawRows(self, rows):
+        bound = min(self.l_item, len(self.items))
+        for i in rows:
+            if self.f_item <= i < bound:
+                self.drawRow(i)
         self.clearSides()
         self.drawIndicators()
-        self.drawBottomLine()
-        self.win.refresh()
 
     def drawItems(self):
-        # Translate any non-strings into strings
-        strings = []
-        for item in self.items:
-            strings.append(repr(item))
-
         # Draw items within moving frame
-        attr = 0
-        counter = 0
         bound = min(self.l_item, len(self.items))
         for i in range(self.f_item, bound):
-            # Specify applicable attributes
-            if(counter + self.f_item == self.curr_item):
-                attr = (attr | curses.A_REVERSE)
-                if self.focused:
-                    attr = (attr | get_color_pair("Accent"))
-            item = strings[i][:self.width - 2] # Truncate strings longer than panel width
-            fill_spaces = (self.width - calc_string_width(item)) - 2
-            itemline = str(item) + (" " * fill_spaces)
-            item_point = Point(counter + 1, 1)
-            self.win.attron(attr)
-            draw.string(item_point, itemline, self.win)
-            self.win.attroff(attr)
-            counter += 1
-            attr = 0
+            self.drawRow(i)
+        self.trimLineCache()
+
+    def drawRow(self, i):
+        # Specify applicable attributes
+        attr = 0
+        if(i == self.curr_item):
+            attr = (attr | curses.A_REVERSE)
+            if self.focused:
+                attr = (attr | get_color_pair("Accent"))
+        itemline = self.getItemLine(i)
+        item_point = Point(i - self.f_item + 1, 1)
+        self.win.attron(attr)
+        draw.string(item_point, itemline, self.win)
+        self.win.attroff(attr)
+
+    def getItemLine(self, i):
+        if i not in self.lineCache:
+            self.lineCache[i] = self.formatItemLine(self.items[i])
+
+        return self.lineCache[i]
+
+    def formatItemLine(self, item):
+        # Translate any non-strings into strings
+        return textwidth.pad(repr(item), self.width - 2)
+
+    def trimLineCache(self):
+        # Keep the lines around the frame formatted, and forget everything else
+        first = max(0, self.f_item - LIST_OVERSCAN)
+        last = min(len(self.items), self.l_item + LIST_OVERSCAN)
+        self.lineCache = {i: self.getItemLine(i) for i in range(first, last)}
+
+    def invalidateLines(self):
+        self.lineCache = {}
+        self.itemsVersion += 1
 
     def drawIndicators(self):
         if(self.f_item > 0):
@@ -462,25 +513,34 @@ class ListPanel(Panel):
 
     def setItems(self, new_items):
         self.items = new_items
+        self.invalidateLines()
+        self.letterIndex = None
         self.resetMovingFrame()
 
     def addItem(self, item):
         self.items.append(item)
+        self.invalidateLines()
+        self.letterIndex = None
         self.resetMovingFrame()
 
     def clearItems(self):
         self.items = []
+        self.invalidateLines()
+        self.letterIndex = None
         self.resetMovingFrame()
 
     def resize(self, new_dimensions):
         self.constructPanelWindow(new_dimensions)
+        self.invalidateLines()
         self.resetMovingFrame()
 
     def resetMovingFrame(self):
-        self.curr_item = min(self.curr_item, self.height - 3, max(0, len(self.items) - 1))
-        if len(self.items) < self.height - 1:
-            self.f_item = 0
-        self.l_item = min(len(self.items), self.f_item + (self.height - 3))
+        # Pull the frame back if the list shrank out from under it, then keep
+        # the highlight inside it
+        rows = self.height - 3
+        self.f_item = max(0, min(self.f_item, len(self.items) - rows))
+        self.l_item = min(len(self.items), self.f_item + rows)
+        self.curr_item = max(self.f_item, min(self.curr_item, self.l_item - 1))
 
     def focus(self):
         self.focused = True
@@ -488,11 +548,6 @@ class ListPanel(Panel):
     def unfocus(self):
         self.focused = False
 
-def calc_string_width(text):
-    fake_length = len(text.replace(u'’', u"'").encode('utf-8'))
-    num_wide = sum(unicodedata.east_asian_width(c) in 'WF' for c in text)
-    return fake_length - num_wide
-
 """
 The PlaylistPanel is the main panel of the Playlist screen, and shows
 information about the tracks in the current playlist (a.k.a the now-playing
@@ -504,13 +559,73 @@ This panel is also used to show the user their saved playlists.
 PLAYLIST_TOP_BAR_HEIGHT = 1
 PLAYLIST_HEADERS_HEIGHT = 2
 
+"""
+A PlayerPanel lists the server's players, with what each one is up to lined
+up along the right edge. Players can be marked to act on as a group, and are
+remembered by id, so they stay marked as the list is refreshed.
+"""
+
+PLAYER_STATE_WIDTH = len("Disconnected")
+PLAYER_GROUP_WIDTH = len("Sync 9")
+# Narrow panels (e.g. on an 80 column terminal) get the short columns instead
+PLAYER_SHORT_STATES = { "Playing": "Play", "Stopped": "Stop", "Off": "Off", "Disconnected": "Lost" }
+PLAYER_SHORT_STATE_WIDTH = len("Play")
+PLAYER_SHORT_GROUP_WIDTH = len("S9")
+MIN_PLAYER_NAME_WIDTH = 16
+
+class PlayerPanel(ListPanel):
+    def __init__(self, panel_dimensions, title=""):
+        super().__init__(panel_dimensions, title)
+        self.markedPlayers = set()
+
+    def formatItemLine(self, player):
+        name_width = self.width - (PLAYER_GROUP_WIDTH + PLAYER_STATE_WIDTH + 6)
+        marker = "*" if player.player_id in self.markedPlayers else " "
+        if name_width >= MIN_PLAYER_NAME_WIDTH:
+            group = f"Sync {player.sync_group}" if player.sync_group > 0 else ""
+            group = group.ljust(PLAYER_GROUP_WIDTH)
+            state = player.getState().rjust(PLAYER_STATE_WIDTH)
+        else:
+            name_width = self.width - (PLAYER_SHORT_GROUP_WIDTH + PLAYER_SHORT_STATE_WIDTH + 6)
+            group = f"S{player.sync_group}" if player.sync_group > 0 else ""
+            group = group.ljust(PLAYER_SHORT_GROUP_WIDTH)
+            state = PLAYER_SHORT_STATES[player.getState()].rjust(PLAYER_SHORT_STATE_WIDTH)
+
+        return marker + " " + textwidth.pad(player.name, name_width) + " " + group + " " + state
+
+    def getHighlightState(self):
+        return (self.curr_item, frozenset(self.markedPlayers))
+
+    def getChangedRows(self, old_highlights, new_highlights):
+        (old_item, old_marked) = old_highlights
+        (new_item, new_marked) = new_highlights
+        changed = old_marked ^ new_marked
+
+        return {old_item, new_item} | {i for (i, player) in enumerate(self.items)
+                                       if player.player_id in changed}
+
+    def markItem(self):
+        player_id = self.getCurrentItem().player_id
+        if player_id not in self.markedPlayers:
+            self.markedPlayers.add(player_id)
+        else:
+            self.markedPlayers.remove(player_id)
+        self.lineCache.pop(self.curr_item, None)
+
+    def clearMarkedItems(self):
+        self.markedPlayers = set()
+        self.invalidateLines()
+
+    def getMarkedItems(self):
+        return [player for player in self.items if player.player_id in self.markedPlayers]
+
 class PlaylistPanel(ListPanel):
     def __init__(self, panel_dimensions, title=""):
         super().__init__(panel_dimensions, title)
         self.l_item = min(len(self.items), self.height - (PLAYLIST_HEADERS_HEIGHT + 3))
         self.constructColumnWidths()
         self.moveStart = -1
-        self.markedItems = []
+        self.markedItems = set()
 
     def constructColumnWidths(self):
         # Column names:      Title,  Album, Track,   Artist, Year
@@ -532,16 +647,30 @@ class PlaylistPanel(ListPanel):
         self.columnWidths['year'] = year_x
 
     def render(self):
-        self.clearScreen()
-        self.drawTitleLine()
-        self.drawTitle()
-        self.drawColumnHeaders()
-        self.drawHeadersUnderline()
-        self.drawItems()
-        self.clearSides()
-        self.drawIndicators()
-        self.drawBottomLine()
-        self.win.refresh()
+        state = (self.getFrameState(), self.getHighlightState())
+        if self.renderedState is None or state[0] != self.renderedState[0]:
+            self.clearScreen()
+            self.drawTitleLine()
+            self.drawTitle()
+            self.drawColumnHeaders()
+            self.drawHeadersUnderline()
+            self.drawItems()
+            self.clearSides()
+            self.drawIndicators()
+            self.drawBottomLine()
+        elif state[1] != self.renderedState[1]:
+            self.drawRows(self.getChangedRows(self.renderedState[1], state[1]))
+        self.renderedState = state
+        self.win.noutrefresh()
+
+    def getHighlightState(self):
+        return (self.curr_item, self.moveStart, frozenset(self.markedItems))
+
+    def getChangedRows(self, old_highlights, new_highlights):
+        (old_item, old_move, old_marked) = old_highlights
+        (new_item, new_move, new_marked) = new_highlights
+
+        return {old_item, new_item, old_move, new_move} | (old_marked ^ new_marked)
 
     def drawColumnHeaders(self):
         # Since headers aren't reversed, we don't need to worry about padding with spaces
@@ -580,82 +709,51 @@ class PlaylistPanel(ListPanel):
         draw.char(lr, curses.ACS_RTEE, self.win)
         self.win.attroff(curses.A_ALTCHARSET)
 
-    def drawItems(self):
-        # Draw items within moving frame
-        attr = 0
-        counter = 0
-        bound = min(self.l_item, len(self.items))
-        for i in range(self.f_item, bound):
-            # Specify applicable attributes
-            if(counter + self.f_item == self.curr_item):
-                attr = (attr | curses.A_REVERSE)
-            item = self.items[i]
-            item_y = counter + PLAYLIST_HEADERS_HEIGHT + PLAYLIST_TOP_BAR_HEIGHT
-            self.win.attron(attr)
-            self.drawItem(item, item_y)
-            self.win.attroff(attr)
-            counter += 1
-            attr = 0
-
-    def drawItem(self, item, item_y):
-        # Get our column values from the song object, truncating when necessary
-        title = item.title[:self.columnWidths['title']]
-        album = item.album_title[:self.columnWidths['album']]
-        track = str(item.tracknum)[:self.columnWidths['track']]
-        artist = item.artist[:self.columnWidths['artist']]
-        year = str(item.year)[:self.columnWidths['year']]
-
-        # Fill spaces for each value, based on the width of the column
-        # Keep track of the string so far, to compare length
-        self.song_string = " "
-        absolute_offset = item_y - (PLAYLIST_HEADERS_HEIGHT + PLAYLIST_TOP_BAR_HEIGHT) + self.f_item
-
-        attr = get_color_pair("PlaylistSongTitle")
-        if absolute_offset == self.moveStart or absolute_offset in self.markedItems:
-            attr = curses.A_BOLD | curses.A_REVERSE
-        self.win.attron(attr)
-        self.drawColumn('title', title, item_y)
-        self.win.attroff(attr)
-
-        attr = get_color_pair("PlaylistSongAlbum")
-        if absolute_offset == self.moveStart or absolute_offset in self.markedItems:
-            attr = curses.A_BOLD | curses.A_REVERSE
-        self.win.attron(attr)
-        self.drawColumn('album', album, item_y)
-        self.win.attroff(attr)
-
-        attr = get_color_pair("PlaylistSongTracknum")
-        if absolute_offset == self.moveStart or absolute_offset in self.markedItems:
-            attr = curses.A_BOLD | curses.A_REVERSE
-        self.win.attron(attr)
-        self.drawColumn('track', track, item_y)
-        self.win.attroff(attr)
-
-        attr = get_color_pair("PlaylistSongArtist")
-        if absolute_offset == self.moveStart or absolute_offset in self.markedItems:
-            attr = curses.A_BOLD | curses.A_REVERSE
-        self.win.attron(attr)
-        self.drawColumn('artist', artist, item_y)
-        self.win.attroff(attr)
+    def drawRow(self, i):
+        # Specify applicable attributes
+        row_attr = 0
+        if(i == self.curr_item):
+            row_attr = (row_attr | curses.A_REVERSE)
+        item_y = (i - self.f_item) + PLAYLIST_HEADERS_HEIGHT + PLAYLIST_TOP_BAR_HEIGHT
+        (columns, line) = self.getItemLine(i)
+
+        if i == self.moveStart or i in self.markedItems:
+            # Highlighted rows are a single block of color, so draw them in one go
+            attr = curses.A_BOLD | curses.A_REVERSE | row_attr
+            self.win.addstr(item_y, 1, line, attr)
+            return
 
-        attr = get_color_pair("PlaylistSongYear")
-        if absolute_offset == self.moveStart or absolute_offset in self.markedItems:
-            attr = curses.A_BOLD | curses.A_REVERSE
-        self.win.attron(attr)
-        p = Point(item_y, self.width - 5)
-        draw.string(p, year, self.win)
-        self.win.attroff(attr)
+        for (x, value, color) in columns:
+            self.win.addstr(item_y, x, value, get_color_pair(color) | row_attr)
 
-    def drawColumn(self, name, value, v_offset):
-        fill_spaces = (self.columnWidths[name] - len(value))
-        line = value + (" " * fill_spaces)
-        while len(line) >= self.width - len(self.song_string):
-            line = line.rstrip()
-        while name == 'artist' and len(line) < (self.width - 1) - len(self.song_string):
-            line += " "
-        p = Point(v_offset, len(self.song_string))
-        draw.string(p, line, self.win)
-        self.song_string += line
+    def formatItemLine(self, item):
+        """
+        Each row is laid out once into its columns, as (x, value, color) tuples
+        already padded to the column widths, along with the whole row as a
+        single line. The year column sits on top of the end of the artist
+        column, just like the headers.
+        """
+        # Each column is exactly as wide as its header, except for the artist,
+        # which stretches out to meet the year at the end of the row
+        year_x = self.width - 5
+        artist_x = 1 + self.columnWidths['title'] + self.columnWidths['album'] + self.columnWidths['track']
+        fields = [(item.title, self.columnWidths['title'], "PlaylistSongTitle"),
+                  (item.album_title, self.columnWidths['album'], "PlaylistSongAlbum"),
+                  (str(item.tracknum), self.columnWidths['track'], "PlaylistSongTracknum"),
+                  (item.artist, year_x - artist_x, "PlaylistSongArtist"),
+                  (str(item.year), (self.width - 1) - year_x, "PlaylistSongYear")]
+
+        # Keep track of the line so far, so we know where each column starts
+        line = ""
+        columns = []
+        for (value, column_width, color) in fields:
+            x = textwidth.string_width(line) + 1
+            # Never run into the last cell of the row
+            value = textwidth.pad(value, min(column_width, (self.width - 1) - x))
+            columns.append((x, value, color))
+            line += value
+
+        return (columns, line)
 
     def drawUpperIndicators(self):
         left = Point(PLAYLIST_TOP_BAR_HEIGHT + PLAYLIST_HEADERS_HEIGHT, 0)
@@ -688,22 +786,14 @@ class PlaylistPanel(ListPanel):
     def resize(self, newDimensions):
         self.constructPanelWindow(newDimensions)
         self.constructColumnWidths()
-        self.resetMovingFrame()
-
-    def addItem(self, item):
-        self.items.append(item)
-        self.resetMovingFrame()
-
-    def clearItems(self):
-        self.items = []
+        self.invalidateLines()
         self.resetMovingFrame()
 
     def resetMovingFrame(self):
-        self.curr_item = min(self.curr_item, self.height - (PLAYLIST_HEADERS_HEIGHT + 3),
-                             max(0, len(self.items) - 1))
-        if len(self.items) < self.height - (PLAYLIST_HEADERS_HEIGHT + 3):
-            self.f_item = 0
-        self.l_item = min(len(self.items), self.f_item + (self.height - (PLAYLIST_HEADERS_HEIGHT + 3)))
+        rows = self.height - (PLAYLIST_HEADERS_HEIGHT + 3)
+        self.f_item = max(0, min(self.f_item, len(self.items) - rows))
+        self.l_item = min(len(self.items), self.f_item + rows)
+        self.curr_item = max(self.f_item, min(self.curr_item, self.l_item - 1))
 
     def setMoveStart(self):
         self.moveStart = self.curr_item
@@ -717,12 +807,12 @@ class PlaylistPanel(ListPanel):
 
     def markItem(self):
         if self.curr_item not in self.markedItems:
-            self.markedItems.append(self.curr_item)
+            self.markedItems.add(self.curr_item)
         else:
             self.markedItems.remove(self.curr_item)
 
     def getMarkedItems(self):
-        marked = self.markedItems
-        self.markedItems = []
+        marked = sorted(self.markedItems)
+        self.markedItems = set()
 
         return marked
@@ -0,0 +1,64 @@
+"""
+The Scheduler decides when each kind of data we show gets fetched from the
+server again. Things that change all the time (like the elapsed time of the
+playing track) are checked often, while things that hardly ever change (like
+the list of players) are left alone for much longer.
+
+Each source's interval is stretched out by a backoff factor for every condition
+that makes its data less likely to change (a paused or powered off player, or
+a Listener that will tell us about changes anyway) or less likely to be looked
+at (a user who hasn't pressed anything in a while, or a screen that isn't up).
+"""
+
+import time
+
+# The conditions that slow down each source, by the name they have in the config
+SOURCE_BACKOFFS = { 'Status': ('Off', 'Idle', 'Listening'),
+                    'NowPlaying': ('Paused', 'Off', 'Idle'),
+                    'Players': ('Idle', 'Hidden') }
+
+class Scheduler:
+    def __init__(self, intervals, backoffs, idle_timeout):
+        self.intervals = { source: intervals[source] for source in SOURCE_BACKOFFS }
+        self.backoffs = backoffs
+        self.idleTimeout = idle_timeout
+        # Sources that have never run are due right away
+        self.lastRun = { source: None for source in SOURCE_BACKOFFS }
+        self.lastInput = time.monotonic()
+
+    def touch(self):
+        # The user pressed something, so they're no longer idle
+        self.lastInput = time.monotonic()
+
+    def isIdle(self):
+        return time.monotonic() - self.lastInput >= self.idleTimeout
+
+    def markDue(self, *sources):
+        for source in sources:
+            self.lastRun[source] = None
+
+    def markDone(self, sources):
+        now = time.monotonic()
+        for source in sources:
+            self.lastRun[source] = now
+
+    def getInterval(self, source, conditions):
+        interval = self.intervals[source]
+        for condition in SOURCE_BACKOFFS[source]:
+            if condition in conditions:
+                interval *= self.backoffs[condition]
+
+        return interval
+
+    def getDue(self, conditions):
+        """
+        Returns the set of sources that are due, given the set of conditions
+        that currently hold (e.g. {'Paused', 'Idle'}).
+        """
+        now = time.monotonic()
+        due = set()
+        for (source, last_run) in self.lastRun.items():
+            if last_run is None or now - last_run >= self.getInterval(source, conditions):
+                due.add(source)
+
+        return due
@@ -25,6 +25,10 @@ class Screen:
         for panel in self.panels:
             panel.render()
 
+    def touch(self):
+        for panel in self.panels:
+            panel.touch()
+
     def getCurrentPanel(self):
         return self.panels[self.currentPanelIndex]
 
@@ -0,0 +1,270 @@
+"""
+A SearchIndex lets the user find artists, albums, and songs in the media
+library by typing part of their name, instead of scrolling for them.
+
+Every name is broken up into trigrams (three character chunks), and we keep a
+set of the entries containing each trigram. To answer a query, we intersect
+the sets for the query's trigrams, which narrows things down to a handful of
+candidates without looking at the rest of the library. Words also get a couple
+of space-padded trigrams at their start, so one or two letter queries can
+match the beginnings of words.
+
+If nothing contains the whole query, we fall back to the entries that share
+the most trigrams with it, which forgives the odd typo.
+
+The index is updated in place as the library comes in, so only new or renamed
+entries get broken up into trigrams again. While the library is paged in, each
+page only hands us the artists and albums it added to.
+"""
+
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+MAX_RESULTS = 100
+FUZZY_THRESHOLD = 0.6
+
+# Artists come before albums, which come before songs, when the names are equal
+KIND_ORDER = { 'a': 0, 'b': 1, 's': 2 }
+
+class SearchIndex:
+    def __init__(self):
+        # Entries are keyed by a kind letter and their LMS id, e.g. 's1234'
+        self.entries = {}
+        self.grams = defaultdict(set)
+        self.names = defaultdict(set)
+        # The library is indexed on a Loader thread, while searches come from
+        # the main thread
+        self.lock = threading.Lock()
+        self.generation = 0
+
+    def update(self, artists, generation=0):
+        """
+        Bring the index in line with the given artists. We only hold on to
+        each entry's own object, and work out the path to it (artist, album,
+        song) when it turns up in a search.
+
+        Every load of the library passes a higher generation than the last. A
+        load that has been superseded may still be running, so anything it
+        sends after a newer load has been heard from is ignored.
+        """
+        with self.lock:
+            if self.isSuperseded(generation):
+                return
+            self.updateEntries(artists)
+
+    def add(self, artists, albums, generation=0):
+        """
+        Index just the given artists, and the given albums along with their
+        songs, leaving the rest of the index alone.
+        """
+        with self.lock:
+            if self.isSuperseded(generation):
+                return
+
+            seen = set()
+            for artist in artists:
+                self.updateEntry('a' + str(artist.artist_id), artist.name, artist, seen)
+            for album in albums:
+                self.updateEntry('b' + str(album.album_id), album.title, album, seen)
+                for song in (album.songs or []):
+                    self.updateEntry('s' + str(song.song_id), song.title, song, seen)
+
+    def isSuperseded(self, generation):
+        if generation < self.generation:
+            return True
+
+        self.generation = generation
+        return False
+
+    def updateEntries(self, artists):
+        seen = set()
+        for artist in artists:
+            self.updateEntry('a' + str(artist.artist_id), artist.name, artist, seen)
+            for album in (artist.albums or []):
+                self.updateEntry('b' + str(album.album_id), album.title, album, seen)
+                for song in (album.songs or []):
+                    self.updateEntry('s' + str(song.song_id), song.title, song, seen)
+
+        # Forget about anything that is gone
+        if len(seen) < len(self.entries):
+            for key in [key for key in self.entries if key not in seen]:
+                self.removeEntry(key)
+
+    def updateEntry(self, key, name, item, seen):
+        seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.addEntry(key, name, item)
+        elif entry[1] != name:
+            self.removeEntry(key)
+            self.addEntry(key, name, item)
+        else:
+            # Same name, but the object may have been fetched again
+            entry[2] = item
+
+    def addEntry(self, key, name, item):
+        text = normalize(name)
+        self.entries[key] = [text, name, item]
+        self.names[text].add(key)
+        for gram in make_grams(text, key[0]):
+            self.grams[gram].add(key)
+
+    def removeEntry(self, key):
+        (text, name, item) = self.entries.pop(key)
+        remove_posting(self.names, text, key)
+        for gram in make_grams(text, key[0]):
+            remove_posting(self.grams, gram, key)
+
+    def getPath(self, key):
+        item = self.entries[key][2]
+        if key[0] == 'a':
+            return (item,)
+        if key[0] == 'b':
+            return (self.entries['a' + str(item.artist_id)][2], item)
+
+        album = self.entries['b' + str(item.album_id)][2]
+        return (self.entries['a' + str(album.artist_id)][2], album, item)
+
+    def search(self, query):
+        """
+        Returns the paths of the best matches for the query, best first.
+        """
+        query = normalize(query)
+        words = query.split()
+        if not words:
+            return []
+
+        with self.lock:
+            ranked = self.rank(self.findExact(make_query_grams(words)), query, words)
+            if not ranked:
+                # Nothing has the whole query in it, so go by how much of it matched
+                ranked = self.findFuzzy(make_word_grams(query))
+
+            return [self.getPath(key) for key in ranked]
+
+    def findExact(self, grams):
+        postings = [self.grams.get(gram) for gram in grams]
+        if not all(postings):
+            return set()
+
+        # Intersect starting from the rarest trigram, to keep the sets small
+        postings.sort(key=len)
+        keys = set(postings[0])
+        for p in postings[1:]:
+            keys &= p
+            if not keys:
+                break
+
+        return keys
+
+    def findFuzzy(self, grams):
+        # A word's first letter alone matches far too much to be worth counting
+        grams = [gram for gram in grams if not gram.startswith("  ")]
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.grams.get(gram, ()))
+        needed = max(1, round(len(grams) * FUZZY_THRESHOLD))
+        keys = [key for (key, count) in counts.items() if count >= needed]
+
+        # The more trigrams in common the better, and the closer in length
+        return heapq.nsmallest(MAX_RESULTS, keys,
+                               key = lambda key: (-counts[key], len(self.entries[key][0])))
+
+    def rank(self, keys, query, words):
+        """
+        Exact matches come first, then names that start with the query, then
+        names with a word that starts with it, then everything else. Within
+        those, artists beat albums beat songs, and shorter names win, though
+        a name that starts with the query as a whole word beats one that
+        doesn't.
+
+        Short queries can match a good part of the library, so we go one tier
+        at a time, using the index to find each one, and stop as soon as we
+        have enough results.
+        """
+        by_length = lambda key: len(self.entries[key][0])
+        by_kind = lambda key: KIND_ORDER[key[0]]
+
+        exact = keys & self.names.get(query, set())
+        ranked = heapq.nsmallest(MAX_RESULTS, exact, key=by_kind)
+
+        for kind in KIND_ORDER:
+            starts = keys & self.findExact(make_start_grams(query, kind)) - exact
+            if len(query) > 2:
+                # The start trigrams only cover the first two characters
+                starts = [key for key in starts if self.entries[key][0].startswith(query)]
+            # Names where the query ends on a whole word go first
+            ranked += heapq.nsmallest(MAX_RESULTS - len(ranked), starts,
+                                      key = lambda key: (self.entries[key][0][len(query)] != " ",
+                                                         by_length(key)))
+            if len(ranked) >= MAX_RESULTS:
+                return ranked
+
+        # Whatever's left just has the query somewhere in the middle. Longer
+        # words can have their trigrams show up out of order, so check those.
+        verify = any(len(w) > 3 for w in words)
+        word_query = " " + query
+        buckets = [[] for i in range(2 * len(KIND_ORDER))]
+        for key in keys - set(ranked):
+            text = self.entries[key][0]
+            if verify and not all(w in text for w in words):
+                continue
+            middle = word_query not in text
+            buckets[middle * len(KIND_ORDER) + by_kind(key)].append(key)
+        for bucket in buckets:
+            ranked += heapq.nsmallest(MAX_RESULTS - len(ranked), bucket, key=by_length)
+
+        return ranked[:MAX_RESULTS]
+
+def normalize(text):
+    # Ignore case and accents, and treat punctuation as spaces
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+
+    return " ".join(re.findall(r'\w+', text))
+
+def remove_posting(postings, value, key):
+    keys = postings[value]
+    keys.discard(key)
+    if not keys:
+        del postings[value]
+
+def make_grams(text, kind):
+    return make_start_grams(text, kind) | make_word_grams(text)
+
+def make_word_grams(text):
+    grams = set()
+    for word in text.split():
+        padded = "  " + word
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+
+    return grams
+
+def make_start_grams(text, kind):
+    """
+    These mark how the whole name starts, and what kind of entry it is, using a
+    character that can't show up in a normalized name so they never get mixed
+    up with the other trigrams.
+    """
+    return {kind + ("^^" + text)[i:i + 3] for i in range(min(2, len(text)))}
+
+def make_query_grams(words):
+    """
+    Longer words can match anywhere, so only their inner trigrams are used.
+    Words too short to have any have to match the start of a word instead.
+    """
+    grams = set()
+    for word in words:
+        if len(word) < 3:
+            padded = "  " + word
+            grams.update(padded[i:i + 3] for i in range(len(word)))
+        else:
+            grams.update(word[i:i + 3] for i in range(len(word) - 2))
+
+    return grams
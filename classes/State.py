@@ -0,0 +1,80 @@
+"""
+The PlayerState is our local copy of what the connected player is doing. The
+Engine refreshes it whenever the Listener tells us the server state changed,
+and the Statusline/Playbar render straight from it.
+
+Since the elapsed time of a playing track moves forward on its own, we don't
+ask the server for it every frame. Instead we remember the last position the
+server gave us, and count forward from there with a monotonic clock. The
+Scheduler decides how often we check back in with the server to correct for
+any drift.
+"""
+
+import threading
+import time
+
+class PlayerState:
+    def __init__(self):
+        self.player_info = {}
+        self.scan_info = { 'scan_status': False, 'scan_progress': None }
+        self.track_info = {}
+        self.syncedAt = 0
+        self.syncedElapsedTime = 0
+        self.playerInfoChanged = True
+        self.trackInfoChanged = True
+        # Set from the Listener thread, so it has to be thread-safe
+        self.stale = threading.Event()
+        self.stale.set()
+
+    def invalidate(self):
+        self.stale.set()
+
+    def isStale(self):
+        return self.stale.is_set()
+
+    def markFresh(self):
+        self.stale.clear()
+
+    def isPlaying(self):
+        return self.player_info.get('power') == 1 and self.player_info.get('mode') == 'play'
+
+    def updatePlayerInfo(self, player_info):
+        # Rescans are reported separately, but shown alongside the player's state
+        player_info = dict(player_info, **self.scan_info)
+        if player_info != self.player_info:
+            self.player_info = player_info
+            self.playerInfoChanged = True
+
+    def updateScanInfo(self, scan_info):
+        self.scan_info = scan_info
+        self.updatePlayerInfo(self.player_info)
+
+    def updateTrackInfo(self, track_info):
+        # Remember where the server says we are, so we can count from there
+        self.syncedAt = time.monotonic()
+        self.syncedElapsedTime = track_info.get('elapsed_time', 0)
+
+        if track_info != self.track_info:
+            self.track_info = track_info
+            self.trackInfoChanged = True
+
+    def getInterpolatedTime(self):
+        return self.syncedElapsedTime + (time.monotonic() - self.syncedAt)
+
+    def isPoweredOff(self):
+        return self.player_info.get('power') == 0
+
+    def trackEnded(self):
+        # If we've counted past the end of the track, the next one has started
+        duration = self.track_info.get('duration', 0)
+        return duration > 0 and self.getInterpolatedTime() >= duration
+
+    def advanceElapsedTime(self):
+        if self.track_info == {} or not self.isPlaying():
+            return
+
+        # Only bother the Playbar when the displayed time actually changes
+        elapsed_time = self.getInterpolatedTime()
+        if round(elapsed_time) != round(self.track_info['elapsed_time']):
+            self.track_info = dict(self.track_info, elapsed_time=elapsed_time)
+            self.trackInfoChanged = True
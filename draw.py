@@ -5,8 +5,6 @@ windows. Window must be provided to each function.
 
 import curses
 
-from util import Point
-
 def char(p, ch, win):
     win.addch(p.y, p.x, ch)
 
@@ -17,10 +15,10 @@ def h_line(p1, p2, ch, win):
     if (p1.y != p2.y) or (p1.x == p2.x):
         raise ValueError((p1, p2))
 
+    # Let curses draw the whole line in one call, rather than a char at a time
     left = min(p1.x, p2.x)
     right = max(p1.x, p2.x)
-    for i in range(left, right + 1):
-        char(Point(p1.y, i), ch, win)
+    win.hline(p1.y, left, ch, right - left + 1)
 
 def v_line(p1, p2, ch, win):
     if (p1.x != p2.x) or (p1.y == p2.y):
@@ -28,5 +26,4 @@ def v_line(p1, p2, ch, win):
 
     top = min(p1.y, p2.y)
     bottom = max(p1.y, p2.y)
-    for i in range(top, bottom + 1):
-        char(Point(i, p1.x), ch, win)
+    win.vline(top, p1.x, ch, bottom - top + 1)
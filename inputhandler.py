@@ -6,11 +6,11 @@ import curses
 
 import lmswrapper
 import paneldriver
-from util import Mode
+from util import Debouncer, Mode
 
 from classes.Box import Editbox, Infobox, Listbox, Prompt
 from classes.Music import LMSPlayer
-from classes.Panel import PlaylistPanel
+from classes.Panel import ListPanel, PlaylistPanel
 
 TAB_NUMBERS = [
                 ord('1'), ord('2'), ord('3'),
@@ -78,8 +78,14 @@ def handle_playlist_commands(engine, key):
     elif(key == ord('z')):
         # Toggle shuffle mode
         lmswrapper.toggle_playlist_mode(engine.server, engine.player, 'shuffle')
-        # When we shuffle, playlist order may change, so reload it
-        engine.reloadPlaylist()
+        # When we shuffle, playlist order may change, but the songs are the same
+        engine.syncPlaylist()
+    elif(key == ord('P')):
+        # Move the highlight to the track that is playing now
+        playing_index = engine.state.player_info.get('playlist_cur_index')
+        if playing_index is not None:
+            panel = engine.screens[0].getCurrentPanel()
+            paneldriver.jump_to_item(panel, min(int(playing_index), len(panel.items) - 1))
     elif(key == ord('n')):
         # Rename currently connected player
         editbox = Editbox(f"Enter a New Name for Player '{engine.player.name}'", "Name:", engine.win)
@@ -123,32 +129,32 @@ def handle_media_library_commands(engine, key):
         # Move current panel's highlight down 1
         panel = engine.screens[1].getCurrentPanel()
         paneldriver.move_down(panel, 1)
-        paneldriver.change_media_panels(engine.screens[1])
+        paneldriver.change_media_panels(engine.screens[1], engine.mediaLibrary)
     elif(key == ord('J')):
         # Move current panel's highlight down half the panel size
         panel = engine.screens[1].getCurrentPanel()
         paneldriver.move_down(panel, panel.height // 2)
-        paneldriver.change_media_panels(engine.screens[1])
+        paneldriver.change_media_panels(engine.screens[1], engine.mediaLibrary)
     elif(key == ord('G')):
         # Move current panel's highlight down to the bottom
         panel = engine.screens[1].getCurrentPanel()
         paneldriver.move_down(panel, len(panel.items))
-        paneldriver.change_media_panels(engine.screens[1])
+        paneldriver.change_media_panels(engine.screens[1], engine.mediaLibrary)
     elif(key == ord('k')):
         # Move current panel's highlight up 1
         panel = engine.screens[1].getCurrentPanel()
         paneldriver.move_up(panel, 1)
-        paneldriver.change_media_panels(engine.screens[1])
+        paneldriver.change_media_panels(engine.screens[1], engine.mediaLibrary)
     elif(key == ord('K')):
         # Move current panel's highlight up half the panel size
         panel = engine.screens[1].getCurrentPanel()
         paneldriver.move_up(panel, panel.height // 2)
-        paneldriver.change_media_panels(engine.screens[1])
+        paneldriver.change_media_panels(engine.screens[1], engine.mediaLibrary)
     elif(key == ord('g')):
         # Move current panel's highlight up to the top
         panel = engine.screens[1].getCurrentPanel()
         paneldriver.move_up(panel, len(panel.items))
-        paneldriver.change_media_panels(engine.screens[1])
+        paneldriver.change_media_panels(engine.screens[1], engine.mediaLibrary)
     elif(key == ord('h')):
         # Move focused panel to the left
         engine.screens[1].decrementCurrentPanel()
@@ -173,44 +179,71 @@ def handle_media_library_commands(engine, key):
         infobox = Infobox("Adding Media Selection to Current Playlist...", engine.win)
         infobox.render()
         lmswrapper.control_playlist(engine.server, engine.player, 'add', selected_item)
+    elif(key == ord('/') and engine.config["LazyMediaLibrary"]):
+        # We don't have the whole library to search through, so ask the server
+        search_server(engine)
+    elif(key == ord('/')):
+        # Search the media library, and jump to the best match
+        editbox = Editbox("Search the Media Library", "Search:", engine.win)
+        (query, ret_code) = editbox.getInput()
+        while ret_code == 0:
+            # Handle resizing
+            engine.resizeAll()
+            editbox = Editbox("Search the Media Library", "Search:", engine.win)
+            editbox.injectString(query)
+            (query, ret_code) = editbox.getInput()
+
+        if ret_code != -1:
+            engine.searchResults = engine.searchIndex.search(query)
+            engine.searchPosition = 0
+            if len(engine.searchResults) > 0:
+                paneldriver.jump_to_path(engine.screens[1], engine.searchResults[0],
+                                         engine.mediaLibrary)
+    elif(key == ord('n') or key == ord('N')):
+        # Jump to the next (or previous) match of the last search
+        if len(engine.searchResults) > 0:
+            step = 1 if key == ord('n') else -1
+            engine.searchPosition = (engine.searchPosition + step) % len(engine.searchResults)
+            path = engine.searchResults[engine.searchPosition]
+            paneldriver.jump_to_path(engine.screens[1], path, engine.mediaLibrary)
     else:
         pass # Do nothing
 
 
 def handle_saved_playlist_commands(engine, key):
     if(key == ord('f')):
-        # Reload the saved playlists
-        engine.reloadSavedPlaylists()
+        # Reload the saved playlists, tracks and all
+        engine.reloadSavedPlaylists(refresh=True)
     elif(key == ord('j')):
         # Move current panel's highlight down 1
         panel = engine.screens[2].getCurrentPanel()
         paneldriver.move_down(panel, 1)
-        paneldriver.change_saved_playlist_panel(engine.screens[2])
+        paneldriver.change_saved_playlist_panel(engine.screens[2], engine.savedPlaylists)
     elif(key == ord('J')):
         # Move current panel's highlight down half the panel size
         panel = engine.screens[2].getCurrentPanel()
         paneldriver.move_down(panel, panel.height // 2)
-        paneldriver.change_saved_playlist_panel(engine.screens[2])
+        paneldriver.change_saved_playlist_panel(engine.screens[2], engine.savedPlaylists)
     elif(key == ord('G')):
         # Move current panel's highlight down to the bottom
         panel = engine.screens[2].getCurrentPanel()
         paneldriver.move_down(panel, len(panel.items))
-        paneldriver.change_saved_playlist_panel(engine.screens[2])
+        paneldriver.change_saved_playlist_panel(engine.screens[2], engine.savedPlaylists)
     elif(key == ord('k')):
         # Move current panel's highlight up 2
         panel = engine.screens[2].getCurrentPanel()
         paneldriver.move_up(panel, 1)
-        paneldriver.change_saved_playlist_panel(engine.screens[2])
+        paneldriver.change_saved_playlist_panel(engine.screens[2], engine.savedPlaylists)
     elif(key == ord('K')):
         # Move current panel's highlight up half the panel size
         panel = engine.screens[2].getCurrentPanel()
         paneldriver.move_up(panel, panel.height // 2)
-        paneldriver.change_saved_playlist_panel(engine.screens[2])
+        paneldriver.change_saved_playlist_panel(engine.screens[2], engine.savedPlaylists)
     elif(key == ord('g')):
         # Move current panel's highlight up to the top
         panel = engine.screens[2].getCurrentPanel()
         paneldriver.move_up(panel, len(panel.items))
-        paneldriver.change_saved_playlist_panel(engine.screens[2])
+        paneldriver.change_saved_playlist_panel(engine.screens[2], engine.savedPlaylists)
     elif(key == ord('h')):
         # Move focused panel to the left
         engine.screens[2].decrementCurrentPanel()
@@ -306,13 +339,200 @@ def handle_saved_playlist_commands(engine, key):
     else:
         pass # Do nothing
 
+def handle_search_results_commands(engine, key):
+    if(key == ord('f')):
+        # Run the last search again
+        engine.reloadSearchResults(engine.serverSearchQuery)
+    elif(key == ord('j')):
+        # Move current panel's highlight down 1
+        panel = engine.screens[3].getCurrentPanel()
+        paneldriver.move_down(panel, 1)
+    elif(key == ord('J')):
+        # Move current panel's highlight down half the panel size
+        panel = engine.screens[3].getCurrentPanel()
+        paneldriver.move_down(panel, panel.height // 2)
+    elif(key == ord('G')):
+        # Move current panel's highlight down to the bottom
+        panel = engine.screens[3].getCurrentPanel()
+        paneldriver.move_down(panel, len(panel.items))
+    elif(key == ord('k')):
+        # Move current panel's highlight up 1
+        panel = engine.screens[3].getCurrentPanel()
+        paneldriver.move_up(panel, 1)
+    elif(key == ord('K')):
+        # Move current panel's highlight up half the panel size
+        panel = engine.screens[3].getCurrentPanel()
+        paneldriver.move_up(panel, panel.height // 2)
+    elif(key == ord('g')):
+        # Move current panel's highlight up to the top
+        panel = engine.screens[3].getCurrentPanel()
+        paneldriver.move_up(panel, len(panel.items))
+    elif(key == ord('h')):
+        # Move focused panel to the left
+        engine.screens[3].decrementCurrentPanel()
+    elif(key == ord('l')):
+        # Move focused panel to the right
+        engine.screens[3].incrementCurrentPanel()
+    elif(key == 10): # Key 10 is ENTER
+        # Grab the selected item and pass it to the LMS to load into the playlist
+        panel = engine.screens[3].getCurrentPanel()
+        if len(panel.items) == 0:
+            return
+        selected_item = paneldriver.get_selected_item(panel)
+
+        # Let the user know we are doing work
+        infobox = Infobox("Loading Media Selection...", engine.win)
+        infobox.render()
+        lmswrapper.control_playlist(engine.server, engine.player, 'load', selected_item)
+    elif(key == ord(' ')):
+        # Grab the selected item and pass it to the LMS to append to the playlist
+        panel = engine.screens[3].getCurrentPanel()
+        if len(panel.items) == 0:
+            return
+        selected_item = paneldriver.get_selected_item(panel)
+
+        # Let the user know we are doing work
+        infobox = Infobox("Adding Media Selection to Current Playlist...", engine.win)
+        infobox.render()
+        lmswrapper.control_playlist(engine.server, engine.player, 'add', selected_item)
+    elif(key == ord('/')):
+        # Start a new search
+        search_server(engine)
+    else:
+        pass # Do nothing
+
+def handle_players_commands(engine, key):
+    if(key == ord('f')):
+        # Check on the players right away
+        engine.scheduler.markDue('Players')
+    elif(key == ord('j')):
+        # Move current panel's highlight down 1
+        panel = engine.screens[4].getCurrentPanel()
+        paneldriver.move_down(panel, 1)
+        change_players_panel(engine)
+    elif(key == ord('J')):
+        # Move current panel's highlight down half the panel size
+        panel = engine.screens[4].getCurrentPanel()
+        paneldriver.move_down(panel, panel.height // 2)
+        change_players_panel(engine)
+    elif(key == ord('G')):
+        # Move current panel's highlight down to the bottom
+        panel = engine.screens[4].getCurrentPanel()
+        paneldriver.move_down(panel, len(panel.items))
+        change_players_panel(engine)
+    elif(key == ord('k')):
+        # Move current panel's highlight up 1
+        panel = engine.screens[4].getCurrentPanel()
+        paneldriver.move_up(panel, 1)
+        change_players_panel(engine)
+    elif(key == ord('K')):
+        # Move current panel's highlight up half the panel size
+        panel = engine.screens[4].getCurrentPanel()
+        paneldriver.move_up(panel, panel.height // 2)
+        change_players_panel(engine)
+    elif(key == ord('g')):
+        # Move current panel's highlight up to the top
+        panel = engine.screens[4].getCurrentPanel()
+        paneldriver.move_up(panel, len(panel.items))
+        change_players_panel(engine)
+    elif(key == ord('h')):
+        # Move focused panel to the left
+        engine.screens[4].decrementCurrentPanel()
+    elif(key == ord('l')):
+        # Move focused panel to the right
+        engine.screens[4].incrementCurrentPanel()
+    elif(key == 10): # Key 10 is ENTER
+        # Connect to the highlighted player
+        panel = engine.screens[4].panels[0]
+        if len(panel.items) == 0:
+            return
+        player = paneldriver.get_selected_item(panel)
+        engine.switchPlayer(LMSPlayer(player.name, player.player_id))
+        engine.showPlayerQueue(fetch=False)
+    elif(key == ord(' ')):
+        # Mark the highlighted player as part of the group to act on
+        panel = engine.screens[4].panels[0]
+        if len(panel.items) > 0:
+            panel.markItem()
+    elif(key == ord('u')):
+        # Unmark every player
+        engine.screens[4].panels[0].clearMarkedItems()
+    elif(key == ord('P')):
+        # Pause the group if any of it is playing, otherwise play all of it
+        players = get_group_players(engine)
+        if players:
+            paused = any(player.playing for player in players)
+            lmswrapper.set_players_paused(engine.server, players, paused)
+            engine.scheduler.markDue('Players')
+    elif(key == ord('s')):
+        # Sync the group up with the connected player
+        players = get_group_players(engine)
+        if players:
+            lmswrapper.sync_players(engine.server, engine.player, players)
+            engine.scheduler.markDue('Players')
+    elif(key == ord('S')):
+        # Take the group out of whatever sync groups they're in
+        players = get_group_players(engine)
+        if players:
+            lmswrapper.unsync_players(engine.server, players)
+            engine.scheduler.markDue('Players')
+    else:
+        pass # Do nothing
+
+def get_group_players(engine):
+    # Act on the marked players, or just the highlighted one if none are marked
+    panel = engine.screens[4].panels[0]
+    players = panel.getMarkedItems()
+    if players == [] and len(panel.items) > 0:
+        players = [panel.getCurrentItem()]
+
+    return players
+
+def change_players_panel(engine):
+    # Only the players panel decides which play queue is shown
+    if engine.screens[4].currentPanelIndex == 0:
+        engine.showPlayerQueue()
+
+def search_server(engine):
+    """
+    Results come in on the Search Results screen behind the search box as the
+    user types, but only once they stop typing for a moment, so we don't go to
+    the server on every keystroke.
+    """
+    engine.changeTab(ord('4'))
+    engine.renderAll()
+
+    debouncer = Debouncer(engine.config["SearchDelay"])
+    on_change = lambda query: engine.searchServer(query.strip(), debouncer)
+    editbox = Editbox("Search the Server", "Search:", engine.win)
+    editbox.injectString(engine.serverSearchQuery)
+    debouncer.update(engine.serverSearchQuery)
+    debouncer.flush()
+    (query, ret_code) = editbox.getInput(on_change)
+    while ret_code == 0:
+        # Handle resizing
+        engine.resizeAll()
+        editbox = Editbox("Search the Server", "Search:", engine.win)
+        editbox.injectString(query)
+        (query, ret_code) = editbox.getInput(on_change)
+
+    if ret_code != -1:
+        # Don't wait around for the debounce if the user already hit enter
+        debouncer.update(query)
+        query = debouncer.flush()
+        if query is not None:
+            engine.reloadSearchResults(query)
+
 def handle_generic_commands(engine, key):
     if(key == ord('q')):
         engine.quit = True
     elif(key in TAB_NUMBERS):
         if key == ord('1'):
-            # If switching to the playlist screen, reload the playlist first
-            engine.reloadPlaylist()
+            # If switching to the playlist screen, catch up on any changes first
+            engine.syncPlaylist(check=True)
+        elif key == ord('5'):
+            # If switching to the players screen, check on them right away
+            engine.scheduler.markDue('Players')
         engine.changeTab(key)
     elif(key == ord('c')):
         # Prompt the user if they actually want to clear the playlist
@@ -333,23 +553,34 @@ def handle_generic_commands(engine, key):
 
             # If currently on the Playlist screen, refresh it to show changes
             if engine.currentScreenIndex == 0:
-                engine.reloadPlaylist()
+                engine.screens[0].getCurrentPanel().clearItems()
+                engine.syncPlaylist()
     elif(key == ord('-')):
-        # Volume down
-        lmswrapper.change_volume(engine.server, engine.player, '-5')
+        # Volume down, for the marked players if there are any
+        players = engine.getMarkedPlayers()
+        if players:
+            lmswrapper.change_players_volume(engine.server, players, '-5')
+        else:
+            lmswrapper.change_volume(engine.server, engine.player, '-5')
     elif((key == ord('=')) or (key == ord('+'))): # Shift is optional
-        # Volume up
-        lmswrapper.change_volume(engine.server, engine.player, '+5')
+        # Volume up, for the marked players if there are any
+        players = engine.getMarkedPlayers()
+        if players:
+            lmswrapper.change_players_volume(engine.server, players, '+5')
+        else:
+            lmswrapper.change_volume(engine.server, engine.player, '+5')
     elif(key == ord('o')):
-        # Toggle the player ON and OFF
-        lmswrapper.toggle_power(engine.server, engine.player)
+        # Toggle the player ON and OFF, or turn the marked players all on or all off
+        players = engine.getMarkedPlayers()
+        if players:
+            power = not any(player.power for player in players)
+            lmswrapper.set_players_power(engine.server, players, power)
+            engine.scheduler.markDue('Players')
+        else:
+            lmswrapper.toggle_power(engine.server, engine.player)
     elif(key == ord('p')):
-        # Present a list of players found, and choose one to connect to
-        players = []
-        player_list = engine.server.get_players()
-        for player in player_list:
-            p = LMSPlayer(player['name'], player['playerid'])
-            players.append(p)
+        # Present the list of players we know of, and choose one to connect to
+        players = [LMSPlayer(player.name, player.player_id) for player in engine.players]
         listbox = Listbox("Please Select a Player", players, engine.win)
         choice = listbox.getChoice()
         while choice == "RESIZE":
@@ -357,23 +588,45 @@ def handle_generic_commands(engine, key):
             listbox = Listbox("Please Select a Player", players, engine.win)
             choice = listbox.getChoice()
         if choice != None:
-            engine.player = choice
-
-            # If the user is on the Playlist screen, reload it
-            if engine.currentScreenIndex == 0:
-                engine.reloadPlaylist()
+            # The new player's play queue shows up right away if we've seen it before
+            engine.switchPlayer(choice)
     elif(key == ord('m')):
-        # Only enter move mode if focused on a PlaylistPanel
+        # Only enter move mode if focused on a PlaylistPanel we can edit (the
+        # Players screen's play queue is just for looking at)
         panel = engine.getCurrentScreen().getCurrentPanel()
-        if isinstance(panel, PlaylistPanel):
+        if isinstance(panel, PlaylistPanel) and engine.currentScreenIndex != 4:
             engine.mode = Mode.MOVE
             # Tell the panel to store the start index
             panel.setMoveStart()
     elif(key == ord('d')):
-        # Only enter delete mode if focused on a PlaylistPanel
+        # Only enter delete mode if focused on a PlaylistPanel we can edit
         panel = engine.getCurrentScreen().getCurrentPanel()
-        if isinstance(panel, PlaylistPanel):
+        if isinstance(panel, PlaylistPanel) and engine.currentScreenIndex != 4:
             engine.mode = Mode.DELETE
+    elif(key == ord('%')):
+        # Jump to a point in the focused list, given as a percentage of the way down
+        panel = engine.getCurrentScreen().getCurrentPanel()
+        if isinstance(panel, ListPanel):
+            editbox = Editbox("Jump to Percentage of the List", "Percent:", engine.win)
+            (percentage, ret_code) = editbox.getInput()
+            while ret_code == 0:
+                # Handle resizing
+                engine.resizeAll()
+                editbox = Editbox("Jump to Percentage of the List", "Percent:", engine.win)
+                editbox.injectString(percentage)
+                (percentage, ret_code) = editbox.getInput()
+
+            if ret_code != -1 and percentage.rstrip('%').isdigit():
+                paneldriver.jump_to_percentage(panel, int(percentage.rstrip('%')))
+                change_dependent_panels(engine)
+    elif(key == ord("'")):
+        # Jump to the next item in the focused list starting with whatever key comes next
+        panel = engine.getCurrentScreen().getCurrentPanel()
+        if isinstance(panel, ListPanel):
+            letter = wait_for_key(engine)
+            if 0 <= letter < 0x110000 and chr(letter).isalnum():
+                paneldriver.jump_to_letter(panel, chr(letter))
+                change_dependent_panels(engine)
     elif(key == ord('R')):
         # Prompt user if they want to start a database rescan
         prompt = Prompt("Rescan the Music Database?", engine.win)
@@ -384,12 +637,37 @@ def handle_generic_commands(engine, key):
             confirmed = prompt.getConfirmation()
         if confirmed:
             lmswrapper.trigger_rescan(engine.server)
+            engine.rescanMonitor.watch()
     elif(key == curses.KEY_RESIZE):
         # Begin a cascading call to resize all screens/panels/windows/etc
         engine.resizeAll()
     else:
         pass # Do nothing
 
+def change_dependent_panels(engine):
+    # Some screens fill one panel based on what is highlighted in another
+    if engine.currentScreenIndex == 1:
+        paneldriver.change_media_panels(engine.screens[1], engine.mediaLibrary)
+    elif engine.currentScreenIndex == 2:
+        paneldriver.change_saved_playlist_panel(engine.screens[2], engine.savedPlaylists)
+    elif engine.currentScreenIndex == 4:
+        change_players_panel(engine)
+
+def wait_for_key(engine):
+    key = engine.getInput()
+    while key == -1:
+        key = engine.getInput()
+
+    return key
+
+def report_failed_edit(engine):
+    """
+    A batch of edits that fails partway leaves us not knowing which of them
+    the server applied, so callers fetch the whole playlist again rather than
+    patching up the range they touched.
+    """
+    engine.errorMessage = "Lost Touch With the Server Mid-Edit"
+
 def handle_move_mode_commands(engine, key):
     if(key == ord('q')):
         # Exit move mode without serializing changes
@@ -405,12 +683,23 @@ def handle_move_mode_commands(engine, key):
             if start != end:
                 # Use different queries based on the current screen
                 if engine.currentScreenIndex == 0:
-                    lmswrapper.move_track_in_play_queue(engine.server, engine.player, start, end)
-                    engine.reloadPlaylist()
+                    try:
+                        lmswrapper.move_track_in_play_queue(engine.server, engine.player, start, end)
+                    except OSError:
+                        report_failed_edit(engine)
+                        engine.syncPlaylist()
+                    else:
+                        # Only the tracks between the two spots have shifted
+                        paneldriver.move_item(panel, start, end)
+                        engine.syncPlaylist(min(start, end), max(start, end) + 1)
                 elif engine.currentScreenIndex == 2:
                     playlist = engine.screens[2].panels[0].getCurrentItem()
-                    lmswrapper.move_track_in_saved_playlist(engine.server, playlist.playlist_id, start, end)
-                    engine.reloadSavedPlaylists()
+                    try:
+                        lmswrapper.move_track_in_saved_playlist(engine.server, playlist.playlist_id,
+                                                                start, end)
+                    except OSError:
+                        report_failed_edit(engine)
+                    engine.reloadSavedPlaylistSongs()
                     # Move focused panel back to the playlist tracks
                     engine.screens[2].incrementCurrentPanel()
     elif(key == ord('j')):
@@ -475,14 +764,26 @@ def handle_delete_mode_commands(engine, key):
                     infobox.render()
                     # Use different queries based on the current screen
                     if engine.currentScreenIndex == 0:
-                        lmswrapper.delete_tracks_from_play_queue(engine.server, engine.player, marked_items)
-                        engine.reloadPlaylist()
+                        try:
+                            lmswrapper.delete_tracks_from_play_queue(engine.server, engine.player,
+                                                                     marked_items)
+                        except OSError:
+                            report_failed_edit(engine)
+                            engine.syncPlaylist()
+                        else:
+                            # Only the tracks between the deleted ones have shifted
+                            paneldriver.delete_items(panel, marked_items)
+                            engine.syncPlaylist(min(marked_items),
+                                                max(marked_items) + 1 - len(marked_items))
                     elif engine.currentScreenIndex == 2:
                         playlist = engine.screens[2].panels[0].getCurrentItem()
-                        lmswrapper.delete_tracks_from_saved_playlist(engine.server,
-                                                                     playlist.playlist_id,
-                                                                     marked_items)
-                        engine.reloadSavedPlaylists()
+                        try:
+                            lmswrapper.delete_tracks_from_saved_playlist(engine.server,
+                                                                         playlist.playlist_id,
+                                                                         marked_items)
+                        except OSError:
+                            report_failed_edit(engine)
+                        engine.reloadSavedPlaylistSongs()
     elif(key == ord('j')):
         # Move current panel's highlight down 1
         panel = engine.getCurrentScreen().getCurrentPanel()
@@ -0,0 +1,56 @@
+"""
+This module keeps a copy of the media library on disk, that way we don't have
+to download and rebuild the whole thing from the LMS every time horizon starts.
+
+Each cache file belongs to a single server, and is stored alongside the
+server's library fingerprint. If the fingerprint the server gives us doesn't
+match the one in the cache, the library has changed and the cache is stale.
+"""
+
+import os
+import pickle
+
+# Bump this whenever the Music classes change shape, to invalidate old caches
+CACHE_VERSION = 3
+
+def get_cache_path(config):
+    cache_dir = os.path.expanduser(config["LibraryCacheDirectory"])
+    server = f"{config['ServerIP']}-{config['ServerPort']}".replace(os.sep, '_')
+
+    return os.path.join(cache_dir, f"library-{server}.pickle")
+
+def load_library(path, fingerprint):
+    try:
+        with open(path, 'rb') as fp:
+            (version, cached_fingerprint, library) = pickle.load(fp)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError,
+            pickle.UnpicklingError):
+        # Missing or unreadable caches (or ones that refer to classes that have
+        # since moved) are treated the same as stale ones
+        return None
+
+    if version != CACHE_VERSION or cached_fingerprint != fingerprint:
+        return None
+
+    return library
+
+def save_library(path, fingerprint, library):
+    # Write to a temporary file first, so a crash can't leave a half-written cache
+    temp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'wb') as fp:
+            pickle.dump((CACHE_VERSION, fingerprint, library), fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        # A read-only or full disk just means no cache next time, we still
+        # have the library we loaded
+        delete_library(temp_path)
+
+def delete_library(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # Nothing there to delete, or we can't touch it (a stale cache is still
+        # caught by its fingerprint)
+        pass
@@ -3,115 +3,360 @@ This module aims to fill some holes in the lmsquery library, including adding
 my own query wrappers for common functions and server commands.
 """
 
-from classes.Music import Album, Artist, Playlist, Song
+from classes.Music import ALBUM_ORDER, SONG_ORDER, Album, Artist, PlayerStatus, Playlist, Song
 
 """
-Songinfo queries return a list of dictionaries, so we use this function to
-collapse the list into a single dictionary with each key/value pair.
+We fetch the playlist a page at a time, each page carrying full track metadata.
+After every page we yield the playlist so far, along with how far along we are,
+so callers can show the user something before the whole playlist is in.
 """
-def collapse_songinfo(songinfo):
-    return {key: value for d in songinfo for key, value in d.items()}
-
-def get_current_playlist(lms, player):
+def iter_current_playlist(lms, player, page_size):
     player_id = player.player_id
     playlist = []
 
-    # Determine how many tracks there are in the playlist
-    num_tracks = lms.query(player_id, "playlist", "tracks", "?")['_tracks']
+    while True:
+        status = lms.query(player_id, "status", len(playlist), page_size, "tags:aelsty")
+        num_tracks = status.get('playlist_tracks', 0)
+        tracks = status.get('playlist_loop', [])
+        for track in tracks:
+            playlist.append(make_song(track))
+
+        # Hand back a copy, since we keep adding to our own list
+        yield (list(playlist), len(playlist), num_tracks)
 
-    # For every track, get its path, and use the path to get the metadata
-    for i in range(num_tracks):
-        paths = lms.query(player_id, "playlist", "path", i, "?")
-        songinfo = lms.query("", "songinfo", 0, 9999, "url:" + paths['_path'], "tags:aelsty")['songinfo_loop']
-        s = collapse_songinfo(songinfo)
+        # Stop once we have everything, or if the playlist shrank out from under us
+        if tracks == [] or len(playlist) >= num_tracks:
+            break
 
-        song = Song(s['id'], s['title'], s['artist'], s['artist_id'],
-                    s['album'], s['album_id'], s['year'], s.get('tracknum', 0))
-        playlist.append(song)
+def get_playlist_fingerprint(lms, player):
+    # The playlist timestamp changes whenever anything edits the play queue
+    status = lms.query(player.player_id, "status", 0, 0)
+    fingerprint = (status.get('playlist_tracks', 0),
+                   status.get('playlist_timestamp'))
 
-    return playlist
+    return fingerprint
 
-def get_now_playing(lms, player):
+def get_playlist_ids(lms, player, start, stop, page_size):
     player_id = player.player_id
+    ids = []
 
-    # Query the status of the player to get the playing track's index in the playlist
-    status = lms.query(player_id, 'status')
-    try:
-        playing_index = int(status['playlist_cur_index'])
-    except KeyError:
-        # There is nothing in the playlist to grab
-        return {}
+    # Asking for only the album id tag keeps each track down to a few bytes
+    while start + len(ids) < stop:
+        count = min(page_size, stop - start - len(ids))
+        status = lms.query(player_id, "status", start + len(ids), count, "tags:e")
+        tracks = status.get('playlist_loop', [])
+        if tracks == []:
+            break
+        ids += [track['id'] for track in tracks]
 
-    # Query the status again, but now with the specific index, and get the track_id
-    playing_track = lms.query(player_id, 'status', playing_index, 1, '-')['playlist_loop'][0]
-    track_id = playing_track['id']
+    return ids
 
-    # Now that we have the ID, do a songinfo query on the track
-    songinfo = lms.query(player_id, 'songinfo', 0, 9999, 'track_id:' + str(track_id),
-                         'tags:adly')['songinfo_loop']
-    track_info = collapse_songinfo(songinfo)
+"""
+Once we have the playlist, most edits only shift songs we already know about
+around. Given our copy of the playlist with an edit already applied to it, we
+ask LMS for just the song ids in the range [start, stop) that the edit could
+have touched, and reuse our own songs for them. Only runs of songs we have
+never seen get fetched in full. If the playlist is not the length we expect,
+something else changed it too, so we check everything from start to the end.
+"""
+def sync_playlist(lms, player, playlist, start, stop, num_tracks, page_size):
+    if num_tracks != len(playlist):
+        stop = None
+    server_stop = num_tracks if stop is None else stop
+    ids = get_playlist_ids(lms, player, start, server_stop, page_size)
+
+    known = { song.song_id: song for song in playlist }
+    songs = [known.get(song_id) for song_id in ids]
+
+    # Find the runs of songs we still need, and fetch them all at once
+    runs = []
+    for (i, song) in enumerate(songs):
+        if song is not None:
+            continue
+        if runs and runs[-1][1] == i:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
 
-    # Query the elapsed time of the playing track
-    timeinfo = lms.query(player_id, 'time', '?')
-    track_info['elapsed_time'] = timeinfo['_time']
+    queries = [(player.player_id, "status", start + i, j - i, "tags:aelsty") for (i, j) in runs]
+    for ((i, j), status) in zip(runs, lms.query_many(queries)):
+        for (k, track) in enumerate(status.get('playlist_loop', [])[:j - i]):
+            songs[i + k] = make_song(track)
 
-    return track_info
+    # Anything the server dropped in the meantime is left out
+    songs = [song for song in songs if song is not None]
+    tail = [] if stop is None else playlist[stop:]
 
-def get_player_info(lms, player):
-    player_id = player.player_id
-    status = lms.query(player_id, 'status', 0, 9999)
+    return playlist[:start] + songs + tail
 
-    # We also want the status of the server rescan
-    res = lms.query("", "rescan", "?")
-    scan_status = True if res['_rescan'] == 1 else False
-    status['scan_status'] = scan_status
+"""
+Track listings from status, songinfo, and playlist queries all share the same
+tag names, so we use this function to turn any one of them into a Song. Remote
+streams tend to lack some of the tags, so we fill in sensible blanks for them.
+"""
+def make_song(track):
+    return Song(track['id'], track['title'], track.get('artist', ""), track.get('artist_id', 0),
+                track.get('album', ""), track.get('album_id', 0), track.get('year', 0),
+                track.get('tracknum', 0), track.get('disc', 1))
 
-    return status
+"""
+A single status query for the playing track ("-") gives us everything the
+Statusline and Playbar need: the player's state, the playing track's metadata,
+and how far into it we are. We split that into the player info and the track
+info, leaving out the track and elapsed time from the player info so it only
+changes when the player's state does. Rescans are kept track of separately, by
+the RescanMonitor.
+"""
+def split_player_status(status):
+    tracks = status.pop('playlist_loop', [])
+    elapsed_time = status.pop('time', 0)
 
-def get_media_library(lms):
-    # Get all songs, then organize them into albums
-    songs = lms.query("", "songs", 0, 9999, "tags:ACelSty")['titles_loop']
-    albums = {}
+    track_info = {}
+    if 'playlist_cur_index' in status and tracks != []:
+        track_info = dict(tracks[0], elapsed_time=elapsed_time)
 
-    for song in songs:
-        if song['compilation'] == '1':
-            artist = "Various Artists"
-        else:
-            artist = song['albumartist'] if 'albumartist' in song else song['artist']
-        artist_id = song['albumartist_ids'] if 'albumartist_ids' in song else song['artist_ids']
-        if song['album_id'] not in albums:
-            # Create album if it doesn't already exist
-            album = Album(song['album_id'], artist, artist_id, song['album'], song['year'], [])
-            albums[album.album_id] = album
-        # Put song obj into album tracklist
-        song_obj = Song(song['id'], song['title'], artist, artist_id,
-                        song['album'], song['album_id'], song['year'], song.get('tracknum', 0))
-        album = albums[song['album_id']]
-        album.addSong(song_obj)
+    return (status, track_info)
+
+"""
+The Scheduler tells us which sources are due for a refresh. Whatever is due
+gets asked for at the same time, and the player state and now playing track
+share the one status query between them.
+"""
+def get_source_updates(lms, player, sources):
+    queries = {}
+    if 'Status' in sources or 'NowPlaying' in sources:
+        queries['Status'] = (player.player_id, "status", "-", 1, "tags:adlyt")
+    if 'Players' in sources:
+        queries['Players'] = ("", "serverstatus", 0, 9999)
+        queries['SyncGroups'] = ("", "syncgroups", "?")
+    responses = dict(zip(queries, lms.query_many(list(queries.values()))))
+
+    updates = {}
+    if 'Status' in responses:
+        updates['Status'] = split_player_status(responses['Status'])
+    if 'Players' in responses:
+        updates['Players'] = make_player_statuses(responses['Players'], responses['SyncGroups'])
+
+    return updates
 
+"""
+The server status lists every player along with whether it's connected, on, and
+playing, so we can keep tabs on all of them without asking each one in turn.
+Which players are synced together comes from a separate query, which we send
+along at the same time.
+"""
+def get_players(lms):
+    (status, sync_groups) = lms.query_many([("", "serverstatus", 0, 9999),
+                                            ("", "syncgroups", "?")])
+
+    return make_player_statuses(status, sync_groups)
+
+def make_player_statuses(status, sync_groups):
+    # Sync groups are numbered from 1 in the order the server lists them
+    groups = {}
+    for (i, group) in enumerate(sync_groups.get('syncgroups_loop', [])):
+        for player_id in group.get('sync_members', "").split(','):
+            groups[player_id] = i + 1
+
+    return [PlayerStatus(player['playerid'], player['name'], player.get('modelname', ""),
+                         player.get('connected'), player.get('power'), player.get('isplaying'),
+                         groups.get(player['playerid'], 0))
+            for player in status.get('players_loop', [])]
+
+def get_library_fingerprint(lms):
+    # The last scan time and library totals change whenever the library does
+    status = lms.query("", "serverstatus", 0, 0)
+    fingerprint = (status.get('lastscan'),
+                   status.get('info total songs'),
+                   status.get('info total albums'),
+                   status.get('info total artists'))
+
+    return fingerprint
+
+"""
+Rather than asking for every song at once, we page through the library and
+organize each page into albums and artists as it arrives. Songs and albums are
+appended as they come in, and each album and artist a page touched is sorted
+once at the end of it. After every page we yield the library built so far,
+the artists and albums that page added to, and how far along we are, so callers
+can show the user something before the whole library is in (and only look over
+what changed to do it).
+
+The song and album lists we've already yielded may be up on screen, so a page
+never changes them. Instead, the first time a page adds to one, it swaps in a
+copy to add to, and the old list is left as it was.
+"""
+def iter_media_library(lms, page_size):
+    albums = {}
     artists = {}
-    for album in albums.values():
+
+    num_loaded = 0
+    while True:
+        response = lms.query("", "songs", num_loaded, page_size, "tags:ACeilSty")
+        num_songs = response.get('count', 0)
+        songs = response.get('titles_loop', [])
+        copied = set()
+        for song in songs:
+            add_song_to_library(song, albums, artists, copied)
+        num_loaded += len(songs)
+
+        # Only the albums this page added to can be out of order
+        sort_library(albums, artists, {song['album_id'] for song in songs})
+
+        # Everything this page added to got copied, so that's what changed
+        changed = ([item for item in copied if isinstance(item, Artist)],
+                   [item for item in copied if isinstance(item, Album)])
+        yield (sort_artists(artists), changed, num_loaded, num_songs)
+
+        # Stop once we have everything, or if the library shrank out from under us
+        if songs == [] or num_loaded >= num_songs:
+            break
+
+def add_song_to_library(song, albums, artists, copied):
+    if song['compilation'] == '1':
+        artist = "Various Artists"
+    else:
+        artist = song['albumartist'] if 'albumartist' in song else song['artist']
+    artist_id = song['albumartist_ids'] if 'albumartist_ids' in song else song['artist_ids']
+    if song['album_id'] not in albums:
+        # Create album if it doesn't already exist
+        album = Album(song['album_id'], artist, artist_id, song['album'], song['year'], [])
+        albums[album.album_id] = album
+
         if album.artist_id not in artists:
             # Create artist if it doesn't already exist
-            artist = Artist(album.artist_id, album.artist, [])
-            artists[artist.artist_id] = artist
-        artist = artists[album.artist_id]
-        artist.addAlbum(album)
+            artists[album.artist_id] = Artist(album.artist_id, album.artist, [])
+        artist_obj = artists[album.artist_id]
+        if artist_obj not in copied:
+            artist_obj.albums = list(artist_obj.albums)
+            copied.add(artist_obj)
+        artist_obj.addAlbum(album)
+
+    # Put song obj into album tracklist
+    song_obj = Song(song['id'], song['title'], artist, artist_id,
+                    song['album'], song['album_id'], song['year'], song.get('tracknum', 0),
+                    song.get('disc', 1))
+    album = albums[song['album_id']]
+    if album not in copied:
+        album.songs = list(album.songs)
+        copied.add(album)
+    album.addSong(song_obj)
+
+def sort_library(albums, artists, album_ids):
+    # Put the songs of the given albums in order, then the albums of their artists
+    artist_ids = set()
+    for album_id in album_ids:
+        album = albums[album_id]
+        album.sortSongs()
+        artist_ids.add(album.artist_id)
+
+    for artist_id in artist_ids:
+        artists[artist_id].sortAlbums()
+
+def sort_artists(artists):
+    return dict(sorted(artists.items(), key = lambda item: item[1].name.upper()))
+
+def get_artists(lms, page_size):
+    artists = []
+
+    start = 0
+    num_artists = 1
+    while start < num_artists:
+        response = lms.query("", "artists", start, page_size)
+        num_artists = response.get('count', 0)
+        artists_loop = response.get('artists_loop', [])
+        if artists_loop == []:
+            break
+
+        for artist in artists_loop:
+            # We don't know the albums yet, they get fetched when needed
+            artists.append(Artist(artist['id'], artist['artist'], None))
+        start += len(artists_loop)
+
+    artists.sort(key = lambda artist: artist.name.upper())
+
+    return artists
+
+def get_artist_albums(lms, artist):
+    albums_loop = lms.query("", "albums", 0, 9999, f"artist_id:{artist.artist_id}",
+                            "tags:ly")['albums_loop']
+
+    albums = []
+    for album in albums_loop:
+        # We don't know the songs yet, they get fetched when needed
+        albums.append(Album(album['id'], artist.name, artist.artist_id, album['album'],
+                            album.get('year', 0), None))
+    albums.sort(key=ALBUM_ORDER)
+
+    return albums
+
+def get_album_songs(lms, album):
+    songs = lms.query("", "titles", 0, 9999, f"album_id:{album.album_id}",
+                      "tags:aeilsty")['titles_loop']
+
+    # Track numbers start over on every disc, so sort by both
+    songs = [make_song(song) for song in songs]
+    songs.sort(key=SONG_ORDER)
+
+    return songs
 
-    sorted_artists = dict(sorted(artists.items(), key = lambda item: item[1].name.upper()))
-
-    return sorted_artists
+"""
+For libraries too big to keep around, we let the server do the searching. The
+search command finds matching artists and albums, and a titles search finds
+the songs (with all their tags), so we ask for a page of each at once. After
+every page we yield the results so far, along with how many songs we have out
+of how many matched.
+"""
+def iter_search_results(lms, term, page_size, max_results):
+    artists = []
+    albums = []
+    songs = []
+
+    start = 0
+    while True:
+        (found, titles) = lms.query_many([("", "search", start, page_size, f"term:{term}"),
+                                          ("", "titles", start, page_size, f"search:{term}",
+                                           "tags:aelsty")])
+        for artist in found.get('contributors_loop', []):
+            artists.append(Artist(artist['contributor_id'], artist['contributor'], None))
+        for album in found.get('albums_loop', []):
+            # The search doesn't tell us who the album is by, but we don't need to know
+            albums.append(Album(album['album_id'], "", 0, album['album'], 0, None))
+        for song in titles.get('titles_loop', []):
+            songs.append(make_song(song))
+        start += page_size
+
+        num_songs = titles.get('count', 0)
+        yield ((list(artists), list(albums), list(songs)), len(songs), num_songs)
+
+        # Keep going while any kind of result has more pages, up to our limit
+        num_found = max(found.get('contributors_count', 0), found.get('albums_count', 0), num_songs)
+        if start >= min(num_found, max_results):
+            break
 
 def control_playlist(lms, player, command, selected_item):
+    control_playlist_items(lms, player, command, [selected_item])
+
+def control_playlist_items(lms, player, command, selected_items):
     player_id = player.player_id
 
-    # Determine which query to use based on the type of item selected
+    queries = []
+    for item in selected_items:
+        queries.append((player_id, "playlistcontrol", f"cmd:{command}", get_item_filter(item)))
+        # Only the first item replaces the playlist, the rest go in after it
+        if command == 'load':
+            command = 'add'
+
+    lms.query_batch(queries)
+
+def get_item_filter(selected_item):
+    # Determine which filter to use based on the type of item selected
     if isinstance(selected_item, Artist):
-        lms.query(player_id, "playlistcontrol", f"cmd:{command}", f"artist_id:{selected_item.artist_id}")
+        return f"artist_id:{selected_item.artist_id}"
     elif isinstance(selected_item, Album):
-        lms.query(player_id, "playlistcontrol", f"cmd:{command}", f"album_id:{selected_item.album_id}")
+        return f"album_id:{selected_item.album_id}"
     elif isinstance(selected_item, Song):
-        lms.query(player_id, "playlistcontrol", f"cmd:{command}", f"track_id:{selected_item.song_id}")
+        return f"track_id:{selected_item.song_id}"
     else:
         raise ValueError(selected_item)
 
@@ -151,22 +396,53 @@ def toggle_power(lms, player):
 
     lms.query(player_id, "power")
 
-def get_saved_playlists(lms):
-    playlists = []
-    playlist_shells = lms.query("", "playlists", 0, 9999)['playlists_loop']
-    for shell in playlist_shells:
-        playlist = Playlist(shell['id'], shell['playlist'], [])
-        songs = lms.query("", "playlists", "tracks", 0, 9999,
-                          f"playlist_id:{playlist.playlist_id}",
-                          "tags:aelsty")['playlisttracks_loop']
-        for song in songs:
-            s = Song(song['id'], song['title'], song['artist'], song['artist_id'],
-                     song['album'], song['album_id'], song['year'], song.get('tracknum', 0))
-            playlist.addSong(s)
+"""
+These send the same command to a whole group of players at once, rather than
+waiting on each player in turn. Unlike the single player versions, they set
+the state outright instead of toggling it, so a group that starts out mixed
+(some playing, some paused) ends up all the same.
+"""
+def send_to_players(lms, players, *command):
+    lms.query_many([(player.player_id, *command) for player in players])
+
+def set_players_paused(lms, players, paused):
+    if paused:
+        send_to_players(lms, players, "pause", 1)
+    else:
+        # "pause 0" only resumes a paused player, so stopped ones need "play"
+        send_to_players(lms, [player for player in players if not player.playing], "play")
+
+def change_players_volume(lms, players, amount):
+    send_to_players(lms, players, "mixer", "volume", amount)
 
-        playlists.append(playlist)
+def set_players_power(lms, players, power):
+    send_to_players(lms, players, "power", 1 if power else 0)
+
+"""
+Syncing players makes them play the same thing in lockstep. Each player joins
+the leader's sync group, and a player leaves whatever group it's in with "-".
+"""
+def sync_players(lms, leader, players):
+    lms.query_many([(leader.player_id, "sync", player.player_id) for player in players
+                    if player.player_id != leader.player_id])
 
-    return playlists
+def unsync_players(lms, players):
+    send_to_players(lms, players, "sync", "-")
+
+"""
+Saved playlists come in two steps: the list of playlists on its own, which is
+cheap, and then the tracks of one playlist at a time, when they're wanted.
+"""
+def get_saved_playlist_index(lms):
+    playlist_shells = lms.query("", "playlists", 0, 9999).get('playlists_loop', [])
+
+    return [Playlist(shell['id'], shell['playlist'], None) for shell in playlist_shells]
+
+def get_saved_playlist_songs(lms, playlist):
+    response = lms.query("", "playlists", "tracks", 0, 9999,
+                         f"playlist_id:{playlist.playlist_id}", "tags:aelsty")
+
+    return [make_song(track) for track in response.get('playlisttracks_loop', [])]
 
 def load_saved_playlist(lms, player, command, playlist):
     player_id = player.player_id
@@ -206,13 +482,22 @@ def save_new_playlist(lms, player, new_name):
     lms.query(player_id, "playlist", "save", new_name)
 
 def move_track_in_play_queue(lms, player, start, end):
+    move_tracks_in_play_queue(lms, player, [(start, end)])
+
+def move_tracks_in_play_queue(lms, player, moves):
     player_id = player.player_id
 
-    lms.query(player_id, "playlist", "move", start, end)
+    # Moves are applied one after another, so each is relative to the last
+    queries = [(player_id, "playlist", "move", start, end) for (start, end) in moves]
+    lms.query_batch(queries)
 
 def move_track_in_saved_playlist(lms, playlist_id, start, end):
-    lms.query("", "playlists", "edit", f"playlist_id:{playlist_id}",
-              "cmd:move", f"index:{start}", f"toindex:{end}")
+    move_tracks_in_saved_playlist(lms, playlist_id, [(start, end)])
+
+def move_tracks_in_saved_playlist(lms, playlist_id, moves):
+    queries = [("", "playlists", "edit", f"playlist_id:{playlist_id}",
+                "cmd:move", f"index:{start}", f"toindex:{end}") for (start, end) in moves]
+    lms.query_batch(queries)
 
 def delete_saved_playlist(lms, playlist_id):
     lms.query("", "playlists", "delete", f"playlist_id:{playlist_id}")
@@ -222,14 +507,36 @@ def delete_tracks_from_play_queue(lms, player, marked_items):
 
     # Sort our items in descending order to prevent invalidated indices
     marked_items.sort(reverse=True)
-    for index in marked_items:
-        lms.query(player_id, "playlist", "delete", index)
+    queries = [(player_id, "playlist", "delete", index) for index in marked_items]
+    lms.query_batch(queries)
 
 def delete_tracks_from_saved_playlist(lms, playlist_id, marked_items):
     # Sort items in descender order to prevent invalidated indices
     marked_items.sort(reverse=True)
-    for index in marked_items:
-        lms.query("", "playlists", "edit", f"playlist_id:{playlist_id}", "cmd:delete", f"index:{index}")
+    queries = [("", "playlists", "edit", f"playlist_id:{playlist_id}", "cmd:delete", f"index:{index}")
+               for index in marked_items]
+    lms.query_batch(queries)
 
 def trigger_rescan(lms):
     lms.query("", "rescan")
+
+"""
+While a rescan is running, the server lists the steps it has started so far,
+along with how far along each one is. We hand back whether a scan is running,
+and a short description of the step it's on, like "Discovering Files 42%".
+"""
+def get_rescan_progress(lms):
+    status = lms.query("", "rescanprogress")
+    if int(status.get('rescan', 0)) != 1:
+        return (False, None)
+
+    steps = [step for step in status.get('steps', "").split(',') if step != ""]
+    if steps == []:
+        return (True, None)
+
+    step = steps[-1]
+    progress = step.replace('_', ' ').title()
+    if step in status:
+        progress += f" {status[step]}%"
+
+    return (True, progress)
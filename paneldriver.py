@@ -3,48 +3,168 @@ This module handles moving around and modifying the inner bits and bobs of
 Panels, that way they don't need to know how to modify themselves.
 """
 
+import bisect
+
 def move_down(panel, amount):
     # Validate that there are items
     if(len(panel.items) == 0):
         return
 
-    # Set new curr_item and shift frame if necessary
+    # Set new curr_item and shift frame just far enough to show it
     panel.curr_item = min(panel.curr_item + amount, len(panel.items) - 1)
-    while(panel.curr_item >= panel.l_item):
-        panel.f_item += 1
-        panel.l_item += 1
+    if(panel.curr_item >= panel.l_item):
+        shift = (panel.curr_item - panel.l_item) + 1
+        panel.f_item += shift
+        panel.l_item += shift
 
 def move_up(panel, amount):
     # Validate that there are items
     if(len(panel.items) == 0):
         return
 
-    # Set new curr_item and shift frame if necessary
+    # Set new curr_item and shift frame just far enough to show it
     panel.curr_item = max(panel.curr_item - amount, 0)
-    while(panel.curr_item < panel.f_item):
-        panel.f_item -= 1
-        panel.l_item -= 1
+    if(panel.curr_item < panel.f_item):
+        shift = panel.f_item - panel.curr_item
+        panel.f_item -= shift
+        panel.l_item -= shift
+
+def jump_to_item(panel, index):
+    if index > panel.curr_item:
+        move_down(panel, index - panel.curr_item)
+    else:
+        move_up(panel, panel.curr_item - index)
+
+def jump_to_percentage(panel, percentage):
+    if(len(panel.items) == 0):
+        return
+
+    percentage = min(max(percentage, 0), 100)
+    jump_to_item(panel, round((len(panel.items) - 1) * percentage / 100))
+
+def jump_to_letter(panel, letter):
+    """
+    Jumps to the next item after the highlighted one that starts with the
+    letter, wrapping back around to the first one at the end of the list.
+    """
+    indices = get_letter_index(panel).get(letter.upper())
+    if not indices:
+        return
+
+    position = bisect.bisect_right(indices, panel.curr_item)
+    jump_to_item(panel, indices[position % len(indices)])
+
+def get_letter_index(panel):
+    # Built the first time it's needed, and thrown out whenever the items change
+    if panel.letterIndex is None:
+        letter_index = {}
+        for (i, item) in enumerate(panel.items):
+            letter = get_first_letter(item)
+            letter_index.setdefault(letter, []).append(i)
+        panel.letterIndex = letter_index
+
+    return panel.letterIndex
+
+def get_first_letter(item):
+    for c in repr(item):
+        if c.isalnum():
+            return c.upper()
 
-def change_media_panels(media_library_screen):
+    return ""
+
+def change_media_panels(media_library_screen, library=None):
+    """
+    If we were given a LazyLibrary, the albums and songs haven't been fetched
+    up front, so we have to ask the library for them instead.
+    """
     panel_index = media_library_screen.currentPanelIndex
 
     if panel_index == 0:
         # Get artist info and put albums into albums panel
         artist = media_library_screen.panels[0].getCurrentItem()
-        media_library_screen.panels[1].setItems(artist.albums)
+        albums = library.getAlbums(artist) if library else artist.albums
+        media_library_screen.panels[1].setItems(albums)
 
     if panel_index == 0 or panel_index == 1:
         # Get album info and put songs into songs panel
+        if len(media_library_screen.panels[1].items) == 0:
+            media_library_screen.panels[2].clearItems()
+            return
         album = media_library_screen.panels[1].getCurrentItem()
-        media_library_screen.panels[2].setItems(album.songs)
+        songs = library.getSongs(album) if library else album.songs
+        media_library_screen.panels[2].setItems(songs)
+
+def jump_to_path(media_library_screen, path, library=None):
+    """
+    A path is an (artist, album, song) tuple, or the start of one, like a
+    search result. We highlight each step of it in turn, filling in the next
+    panel as we go, and leave the focus on the last one.
+    """
+    for (panel_index, item) in enumerate(path):
+        panel = media_library_screen.panels[panel_index]
+        index = find_item(panel, item)
+        if index is None:
+            return
+
+        media_library_screen.setCurrentPanel(panel_index)
+        jump_to_item(panel, index)
+        if panel_index < len(media_library_screen.panels) - 1:
+            change_media_panels(media_library_screen, library)
+
+def find_item(panel, item):
+    # Panels may have been refilled with fresh copies, so match on the id too
+    for (i, candidate) in enumerate(panel.items):
+        if candidate is item or get_item_id(candidate) == get_item_id(item):
+            return i
+
+    return None
+
+def get_item_id(item):
+    for attr in ['song_id', 'album_id', 'artist_id', 'playlist_id', 'player_id']:
+        if hasattr(item, attr):
+            return (attr, getattr(item, attr))
 
 def get_selected_item(panel):
     return panel.getCurrentItem()
 
-def change_saved_playlist_panel(saved_playlists_screen):
+def change_saved_playlist_panel(saved_playlists_screen, saved_playlists):
     panel_index = saved_playlists_screen.currentPanelIndex
 
     if panel_index == 0:
-        # Get playlist info and put tracks into playlist panel
+        # Get playlist info and put tracks into playlist panel, fetching them
+        # if this playlist hasn't been looked at yet
         playlist = saved_playlists_screen.panels[0].getCurrentItem()
-        saved_playlists_screen.panels[1].setItems(playlist.songs)
+        songs = saved_playlists.getSongs(playlist)
+        saved_playlists_screen.panels[1].setItems(songs)
+
+def replace_items(panel, items):
+    # Keep the same row highlighted, as far as the new items allow
+    index = panel.curr_item
+    panel.setItems(items)
+    if len(items) > 0:
+        jump_to_item(panel, min(index, len(items) - 1))
+
+def refill_items(panel, items):
+    # Keep the same item highlighted if it's still there, otherwise the same row
+    selected_item = None
+    if len(panel.items) > 0:
+        selected_item = panel.getCurrentItem()
+    replace_items(panel, items)
+    if selected_item is not None:
+        index = find_item(panel, selected_item)
+        if index is not None:
+            jump_to_item(panel, index)
+
+"""
+These apply an edit we just sent to LMS to our own copy of a list, so it shows
+up right away instead of after the whole list is fetched again.
+"""
+def move_item(panel, start, end):
+    items = list(panel.items)
+    items.insert(end, items.pop(start))
+    replace_items(panel, items)
+
+def delete_items(panel, indices):
+    indices = set(indices)
+    items = [item for (i, item) in enumerate(panel.items) if i not in indices]
+    replace_items(panel, items)
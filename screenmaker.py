@@ -5,7 +5,7 @@ appropriate Screen object, including populating it with the appropriate Panels.
 
 from util import Point
 
-from classes.Panel import DummyPanel, ListPanel, Panel, PlaylistPanel
+from classes.Panel import DummyPanel, ListPanel, Panel, PlayerPanel, PlaylistPanel
 from classes.Screen import Screen
 
 def make_screen(screen_name, screen_dimensions):
@@ -38,6 +38,10 @@ def get_screen_maker(screen_name):
         return _make_media_library_screen
     elif screen_name == 'Saved Playlists':
         return _make_saved_playlists_screen
+    elif screen_name == 'Search Results':
+        return _make_search_results_screen
+    elif screen_name == 'Players':
+        return _make_players_screen
     elif screen_name == 'Test':
         return _make_test_screen
     else:
@@ -98,6 +102,43 @@ def _make_saved_playlists_screen(screen_dimensions):
 
     return screen
 
+def _make_search_results_screen(screen_dimensions):
+    # Search Results are laid out like the Media Library, but the panels aren't nested
+    screen = Screen(screen_dimensions, "Search Results")
+
+    artist_panel_dimensions = get_vertical_third_dimensions(screen_dimensions, 1)
+    album_panel_dimensions = get_vertical_third_dimensions(screen_dimensions, 2)
+    song_panel_dimensions = get_vertical_third_dimensions(screen_dimensions, 3)
+
+    artist_panel = ListPanel(artist_panel_dimensions, "Artists")
+    album_panel = ListPanel(album_panel_dimensions, "Albums")
+    song_panel = ListPanel(song_panel_dimensions, "Songs")
+
+    screen.addPanel(artist_panel)
+    screen.addPanel(album_panel)
+    screen.addPanel(song_panel)
+
+    return screen
+
+def _make_players_screen(screen_dimensions):
+    # Players screen has a 1/3 width panel, and the player's play queue in the other 2/3
+    screen = Screen(screen_dimensions, "Players")
+    (one_third_dimensions, two_thirds_dimensions) = get_players_dimensions(screen_dimensions)
+
+    screen.addPanel(PlayerPanel(one_third_dimensions, "Players"))
+    screen.addPanel(PlaylistPanel(two_thirds_dimensions, "Play Queue"))
+
+    return screen
+
+def get_players_dimensions(screen_dimensions):
+    (screen_ul, screen_lr) = screen_dimensions
+    one_third_dimensions = get_vertical_third_dimensions(screen_dimensions, 1)
+
+    two_thirds_ul = Point(screen_ul.y, one_third_dimensions[1].x)
+    two_thirds_dimensions = (two_thirds_ul, screen_lr)
+
+    return (one_third_dimensions, two_thirds_dimensions)
+
 def _make_test_screen(screen_dimensions):
     # Test screen is just a single empty panel
     screen = Screen(screen_dimensions, "Test")
@@ -113,6 +154,11 @@ def get_screen_resizer(screen_name):
         return _resize_media_library_screen
     elif screen_name == 'Saved Playlists':
         return _resize_saved_playlists_screen
+    elif screen_name == 'Search Results':
+        # Same layout as the Media Library
+        return _resize_media_library_screen
+    elif screen_name == 'Players':
+        return _resize_players_screen
     elif screen_name == 'Test':
         return _resize_test_screen
     else:
@@ -150,6 +196,13 @@ def _resize_saved_playlists_screen(screen, screen_dimensions):
     screen.panels[0].resize(one_quarter_dimensions)
     screen.panels[1].resize(three_quarter_dimensions)
 
+def _resize_players_screen(screen, screen_dimensions):
+    screen.setDimensions(screen_dimensions)
+    (one_third_dimensions, two_thirds_dimensions) = get_players_dimensions(screen_dimensions)
+
+    screen.panels[0].resize(one_third_dimensions)
+    screen.panels[1].resize(two_thirds_dimensions)
+
 def _resize_test_screen(screen, screen_dimensions):
     screen.setDimensions(screen_dimensions)
     for panel in screen.panels:
@@ -0,0 +1,120 @@
+"""
+These tests run the Listener against a tiny fake of the LMS command line
+interface, listening on a local port. The fake can be told to answer pings or
+to go quiet, like a server on the other end of a dead connection.
+"""
+
+import socket
+import threading
+import time
+import unittest
+
+from classes.Listener import Listener
+
+class FakeCLIServer:
+    def __init__(self, answer_pings=True):
+        self.answerPings = answer_pings
+        self.received = []
+        self.clients = []
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                (client, _) = self.server.accept()
+            except OSError:
+                return
+            self.clients.append(client)
+            threading.Thread(target=self.handle, args=(client,), daemon=True).start()
+
+    def handle(self, client):
+        try:
+            with client, client.makefile('rb') as stream:
+                for line in stream:
+                    self.received.append(line)
+                    # The real CLI echoes commands back, with "?" filled in
+                    if line.startswith(b"subscribe"):
+                        client.sendall(line)
+                    elif line.startswith(b"listen") and self.answerPings:
+                        client.sendall(b"listen 1\n")
+        except OSError:
+            # The Listener hung up on us
+            pass
+
+    def notify(self, line):
+        for client in self.clients:
+            client.sendall(line)
+
+    def close(self):
+        self.server.close()
+        for client in self.clients:
+            client.close()
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+
+    return False
+
+class ListenerTest(unittest.TestCase):
+    def startListener(self, server, ping_interval=0.2):
+        self.notifications = []
+        listener = Listener("127.0.0.1", server.port, self.notifications.append,
+                            ping_interval=ping_interval)
+        listener.start()
+        self.addCleanup(listener.stop)
+        self.assertTrue(wait_for(lambda: listener.connected and server.clients))
+
+        return listener
+
+    def testNotificationsReachCallback(self):
+        server = FakeCLIServer()
+        self.addCleanup(server.close)
+        self.startListener(server)
+
+        server.notify(b"aa%3Aaa playlist newsong Song%201 3\n")
+        self.assertTrue(wait_for(lambda: self.notifications))
+        self.assertEqual(self.notifications, [["aa:aa", "playlist", "newsong", "Song 1", "3"]])
+
+    def testQuietServerIsPinged(self):
+        server = FakeCLIServer()
+        self.addCleanup(server.close)
+        listener = self.startListener(server)
+
+        # A server that answers its pings keeps the connection alive
+        self.assertTrue(wait_for(lambda: b"listen ?\n" in server.received))
+        time.sleep(1)
+        self.assertTrue(listener.connected)
+        self.assertEqual(self.notifications, [])
+
+    def testUnansweredPingDropsConnection(self):
+        server = FakeCLIServer(answer_pings=False)
+        self.addCleanup(server.close)
+        listener = self.startListener(server)
+
+        self.assertTrue(wait_for(lambda: not listener.connected))
+
+    def testCallbackErrorsDontStopListener(self):
+        server = FakeCLIServer()
+        self.addCleanup(server.close)
+        listener = self.startListener(server)
+
+        def callback(tokens):
+            self.notifications.append(tokens)
+            if tokens[0] == "rescan":
+                raise AttributeError(tokens)
+        listener.callback = callback
+
+        server.notify(b"rescan done\n")
+        server.notify(b"aa%3Aaa pause 1\n")
+        self.assertTrue(wait_for(lambda: len(self.notifications) == 2))
+        self.assertTrue(listener.connected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+This module measures strings by how many terminal cells they take up, rather
+than how many characters they have. Wide (CJK) characters take up two cells,
+while combining marks and other zero-width characters take up none.
+
+Widths are memoized, since the same titles get measured over and over as the
+user scrolls around.
+"""
+
+import unicodedata
+from functools import lru_cache
+
+WIDTH_CACHE_SIZE = 8192
+
+@lru_cache(maxsize=None)
+def char_width(c):
+    if unicodedata.combining(c) or unicodedata.category(c) in ('Mn', 'Me', 'Cf'):
+        return 0
+    if unicodedata.east_asian_width(c) in 'WF':
+        return 2
+
+    return 1
+
+@lru_cache(maxsize=WIDTH_CACHE_SIZE)
+def string_width(text):
+    if text.isascii():
+        return len(text)
+
+    return sum(char_width(c) for c in text)
+
+"""
+Cut a string down so that it fits in the given number of cells. A wide
+character is never split in half; it gets dropped instead.
+"""
+def truncate(text, width):
+    if width <= 0:
+        return ""
+    if string_width(text) <= width:
+        return text
+
+    used = 0
+    for (i, c) in enumerate(text):
+        w = char_width(c)
+        if used + w > width:
+            return text[:i]
+        used += w
+
+    return text
+
+"""
+Cut a string down or fill it out with spaces, so that it takes up exactly the
+given number of cells.
+"""
+def pad(text, width):
+    text = truncate(text, width)
+
+    return text + (" " * (width - string_width(text)))
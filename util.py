@@ -1,5 +1,7 @@
 import curses
 import json
+import time
+from collections import OrderedDict
 from enum import Enum
 
 class Mode(Enum):
@@ -12,6 +14,69 @@ class Point:
         self.y = y
         self.x = x
 
+"""
+An LRUCache holds on to a fixed number of values, throwing out whichever one
+was used least recently when it runs out of room.
+"""
+
+class LRUCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+"""
+A Debouncer holds on to a value that keeps changing (like a search query being
+typed), and only hands it back once it has stopped changing for a little while.
+"""
+
+class Debouncer:
+    def __init__(self, delay):
+        self.delay = delay
+        self.value = None
+        self.changedAt = 0
+        self.delivered = None
+
+    def update(self, value):
+        if value != self.value:
+            self.value = value
+            self.changedAt = time.monotonic()
+
+    def poll(self):
+        # Returns the value once it has settled, or None if it hasn't (or is old news)
+        if self.value == self.delivered:
+            return None
+        if time.monotonic() - self.changedAt < self.delay:
+            return None
+
+        return self.flush()
+
+    def flush(self):
+        # Returns the value right away, unless it was already handed back
+        if self.value == self.delivered:
+            return None
+        self.delivered = self.value
+
+        return self.value
+
 def get_config():
     with open('config.json') as fp:
         data = json.load(fp)